@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""Check utils.compute_grid against the exhaustive O(count^2) search it replaced.
+
+Both solvers must return the same cell size and counts, ties and rounding included. By default, every count up to
+a limit is checked for fixed and random sizes of the area, followed by the counts around the boundaries where the
+best grid changes shape (k*k and k*(k+1) cells) up to a few thousand, and a random sample of large counts. Exits
+with status 1 on the first difference.
+"""
+
+import argparse
+import math
+import random
+import sys
+import time
+import typing
+
+import numpy as np
+
+from stravaviz import utils
+from stravaviz.xy import XY
+
+DEFAULT_MAX_COUNT = 300
+DEFAULT_MAX_BOUNDARY_COUNT = 3000
+DEFAULT_MAX_LARGE_COUNT = 10000
+# Sizes (mm) checked for every count, followed by random ones.
+SIZES = [XY(300, 300), XY(200, 100), XY(100, 200), XY(297, 210), XY(1, 1000)]
+# Candidates (count_x, count_y) evaluated at once by the reference search, to bound its memory.
+BLOCK_CELLS = 4_000_000
+
+
+def reference_compute_grid(
+    count: int, dimensions: XY
+) -> typing.Tuple[typing.Optional[float], typing.Optional[typing.Tuple[int, int]]]:
+    """The exhaustive search over all count_x and count_y, as compute_grid was before it was optimized.
+
+    The candidates are evaluated with numpy, a block of count_x at a time, with the same floating point operations
+    as the original loops. The first candidate (by count_x, then count_y) with the smallest waste wins, as there.
+    """
+    min_waste = -1.0
+    best_size = None
+    best_counts = None
+    counts_y = np.arange(1, count + 1)
+    sizes_y = dimensions.y / counts_y
+    rows = max(BLOCK_CELLS // max(count, 1), 1)
+    for first in range(1, count + 1, rows):
+        counts_x = np.arange(first, min(first + rows, count + 1))[:, np.newaxis]
+        sizes = np.minimum(dimensions.x / counts_x, sizes_y)
+        wastes = dimensions.x * dimensions.y - count * sizes * sizes
+        wastes[(counts_x * counts_y < count) | (wastes < 0)] = np.inf
+        i, j = divmod(int(np.argmin(wastes)), wastes.shape[1])
+        if wastes[i, j] != np.inf and (best_size is None or wastes[i, j] < min_waste):
+            best_size = float(sizes[i, j])
+            best_counts = int(counts_x[i, 0]), int(counts_y[j])
+            min_waste = float(wastes[i, j])
+    return best_size, best_counts
+
+
+def boundary_counts(max_count: int) -> typing.List[int]:
+    """The counts next to k*k and k*(k+1), above the counts checked one by one, up to max_count."""
+    counts: typing.Set[int] = set()
+    for k in range(1, math.isqrt(max_count) + 1):
+        for boundary in (k * k, k * (k + 1)):
+            counts.update(range(boundary - 2, boundary + 3))
+    return sorted(count for count in counts if count <= max_count)
+
+
+def check(count: int, size: XY) -> None:
+    expected = reference_compute_grid(count, size)
+    actual = utils.compute_grid(count, size)
+    if actual != expected:
+        print(f"compute_grid({count}, {size}) = {actual}, expected {expected}")
+        sys.exit(1)
+
+
+def main() -> None:
+    args_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    args_parser.add_argument(
+        "--max-count", type=int, default=DEFAULT_MAX_COUNT, help="Largest number of cells checked one by one."
+    )
+    args_parser.add_argument(
+        "--max-boundary-count",
+        type=int,
+        default=DEFAULT_MAX_BOUNDARY_COUNT,
+        help="Largest number of cells checked around the k*k and k*(k+1) boundaries.",
+    )
+    args_parser.add_argument(
+        "--max-large-count",
+        type=int,
+        default=DEFAULT_MAX_LARGE_COUNT,
+        help="Largest number of cells of the random large counts.",
+    )
+    args_parser.add_argument("--large-counts", type=int, default=10, help="Number of random large counts checked.")
+    args_parser.add_argument("--random-sizes", type=int, default=10, help="Number of random sizes checked.")
+    args_parser.add_argument("--seed", type=int, default=0, help="Seed of the random sizes and counts.")
+    args = args_parser.parse_args()
+
+    start = time.monotonic()
+    rng = random.Random(args.seed)
+    sizes = SIZES + [XY(rng.uniform(1, 1000), rng.uniform(1, 1000)) for _ in range(args.random_sizes)]
+    for size in sizes:
+        for count in range(args.max_count + 1):
+            check(count, size)
+    # the larger counts are slow to check exhaustively, so each is checked for one size, taking turns
+    counts = [count for count in boundary_counts(args.max_boundary_count) if count > args.max_count]
+    if args.max_large_count > args.max_count:
+        counts += [rng.randint(args.max_count + 1, args.max_large_count) for _ in range(args.large_counts)]
+    for i, count in enumerate(counts):
+        check(count, sizes[i % len(sizes)])
+    print(
+        f"compute_grid matches the exhaustive search for counts 0-{args.max_count} and {len(sizes)} sizes, "
+        f"and {len(counts)} larger counts up to {max(counts, default=args.max_count)} "
+        f"({time.monotonic() - start:.1f}s)."
+    )
+
+
+if __name__ == "__main__":
+    main()
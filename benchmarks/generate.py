@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""Generate a reproducible corpus of synthetic GPX activities for benchmarks.
+
+Activities are random walks with smoothly changing heading and elevation, starting at random points within
+a given distance of a center. The same parameters (and seed) always produce the same files.
+"""
+
+import argparse
+import datetime
+import gzip
+import math
+import os
+import random
+import typing
+import zipfile
+
+# Default number of activities, points per activity and seconds between two points.
+DEFAULT_ACTIVITIES = 500
+DEFAULT_POINTS = 2000
+DEFAULT_INTERVAL = 1.0
+# Default radius (km) around the center within which activities start.
+DEFAULT_SPREAD = 20.0
+DEFAULT_CENTER = (50.08, 14.42)
+# Average speed (m/s) of the generated activities.
+SPEED = 4.0
+EARTH_RADIUS = 6378137.0
+
+
+def generate_activity(
+    rng: random.Random,
+    start: datetime.datetime,
+    points: int,
+    interval: float,
+    center: typing.Tuple[float, float],
+    spread: float,
+) -> str:
+    """Return the GPX document of one activity."""
+    distance = spread * 1000 * math.sqrt(rng.random())
+    bearing = rng.uniform(0, 2 * math.pi)
+    lat = center[0] + math.degrees(distance * math.cos(bearing) / EARTH_RADIUS)
+    lng = center[1] + math.degrees(distance * math.sin(bearing) / EARTH_RADIUS / math.cos(math.radians(lat)))
+    ele = rng.uniform(100, 1000)
+    heading = rng.uniform(0, 2 * math.pi)
+    step = SPEED * interval
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<gpx version="1.1" creator="stravaviz-benchmarks" xmlns="http://www.topografix.com/GPX/1/1">',
+        "<trk><name>activity</name><trkseg>",
+    ]
+    for i in range(points):
+        time = start + datetime.timedelta(seconds=i * interval)
+        lines.append(
+            f'<trkpt lat="{lat:.7f}" lon="{lng:.7f}"><ele>{ele:.1f}</ele>'
+            f'<time>{time.strftime("%Y-%m-%dT%H:%M:%S")}Z</time></trkpt>'
+        )
+        heading += rng.gauss(0, 0.15)
+        lat += math.degrees(step * math.cos(heading) / EARTH_RADIUS)
+        lng += math.degrees(step * math.sin(heading) / EARTH_RADIUS / math.cos(math.radians(lat)))
+        ele = max(ele + rng.gauss(0, 0.5), 1.0)
+    lines.append("</trkseg></trk></gpx>")
+    return "\n".join(lines)
+
+
+def generate_corpus(
+    path: str,
+    activities: int = DEFAULT_ACTIVITIES,
+    points: int = DEFAULT_POINTS,
+    interval: float = DEFAULT_INTERVAL,
+    spread: float = DEFAULT_SPREAD,
+    center: typing.Tuple[float, float] = DEFAULT_CENTER,
+    seed: int = 0,
+    compress: bool = False,
+) -> typing.List[str]:
+    """Write the activities into a directory (or a zip archive if path ends with ".zip").
+
+    Activities start at random times of the day, spread over the two years before 2022, so year filters
+    and merging of activities recorded shortly after each other are exercised as well.
+
+    Returns:
+        Names of the written files (members, for a zip archive).
+    """
+    rng = random.Random(seed)
+    first = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    archive = zipfile.ZipFile(path, "w") if path.endswith(".zip") else None
+    if archive is None:
+        os.makedirs(path, exist_ok=True)
+    names = []
+    end = first
+    try:
+        for i in range(activities):
+            if i > 0 and rng.random() < 0.1:
+                # continue shortly after the previous activity, to be merged with it
+                start = end + datetime.timedelta(minutes=rng.uniform(1, 30))
+            else:
+                start = first + datetime.timedelta(days=rng.uniform(0, 730), seconds=rng.uniform(0, 86400))
+            data = generate_activity(rng, start, points, interval, center, spread).encode("utf-8")
+            end = start + datetime.timedelta(seconds=points * interval)
+            name = f"activity{i:05d}.gpx"
+            if compress:
+                data = gzip.compress(data, mtime=0)
+                name += ".gz"
+            if archive is not None:
+                archive.writestr(f"activities/{name}", data)
+            else:
+                with open(os.path.join(path, name), "wb") as f:
+                    f.write(data)
+            names.append(name)
+    finally:
+        if archive is not None:
+            archive.close()
+    return names
+
+
+def main() -> None:
+    args_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    args_parser.add_argument("path", help='Output directory, or zip archive if it ends with ".zip".')
+    args_parser.add_argument("--activities", type=int, default=DEFAULT_ACTIVITIES, help="Number of activities.")
+    args_parser.add_argument("--points", type=int, default=DEFAULT_POINTS, help="Points per activity.")
+    args_parser.add_argument(
+        "--interval", type=float, default=DEFAULT_INTERVAL, help="Seconds between two points (sampling rate)."
+    )
+    args_parser.add_argument(
+        "--spread", type=float, default=DEFAULT_SPREAD, help="Radius (km) within which activities start."
+    )
+    args_parser.add_argument("--seed", type=int, default=0, help="Seed of the random generator.")
+    args_parser.add_argument("--gzip", action="store_true", help="Write gzipped files (.gpx.gz).")
+    args = args_parser.parse_args()
+    names = generate_corpus(
+        args.path, args.activities, args.points, args.interval, args.spread, seed=args.seed, compress=args.gzip
+    )
+    print(f"Generated {len(names)} activities in '{args.path}'.")
+
+
+if __name__ == "__main__":
+    main()
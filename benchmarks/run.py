@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+"""Benchmark the stages of stravaviz on a synthetic corpus and write the results as JSON.
+
+Each stage (startup of the command line, list, parse, build, simplify, load, load_cached, filter_merge, layout,
+project and drawing each image) is timed (wall and CPU time, including worker processes) and the peak resident
+memory after it is recorded. With --repeat, the fastest run of each stage is reported. Results of two versions
+can be compared with --compare. The benchmark fails if "stravaviz --help" imports a heavy module (see
+HEAVY_MODULES) or takes longer than --max-startup seconds.
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+
+import gpxpy  # type: ignore
+
+import stravaviz
+from stravaviz import gpx_reader, profiling, track_files, utils
+from stravaviz.artifacts import SharedArtifacts
+from stravaviz.drawer import Drawer
+from stravaviz.elevations_drawer import ElevationsDrawer
+from stravaviz.grid_drawer import GridDrawer
+from stravaviz.heatmap_drawer import HeatmapDrawer
+from stravaviz.options import RenderOptions
+from stravaviz.track import DEFAULT_SIMPLIFY_TOLERANCE, Track
+from stravaviz.track_loader import TrackLoader
+from stravaviz.xy import XY
+
+import generate
+
+# Version of the layout of the results.
+SCHEMA = 1
+# Modules "stravaviz --help" must not import; each of them adds tens to hundreds of milliseconds to every start.
+HEAVY_MODULES = ("numpy", "s2sphere", "gpxpy", "pint", "colour", "svgwrite")
+# Default largest startup time (seconds); generous, as timings vary between machines, the import check is exact.
+MAX_STARTUP_SECONDS = 1.0
+
+
+def peak_rss_mb() -> typing.Optional[float]:
+    """Peak resident memory (MB) of this process or of its largest finished child process, if known."""
+    rss = profiling.peak_rss_mb()
+    return max(rss) if rss is not None else None
+
+
+def cpu_seconds() -> float:
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+class Stages:
+    """Time stages, keeping the fastest of repeated runs of each stage."""
+
+    def __init__(self) -> None:
+        self.results: typing.Dict[str, typing.Dict[str, typing.Any]] = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> typing.Iterator[None]:
+        wall, cpu = time.perf_counter(), cpu_seconds()
+        yield
+        result = {
+            "wall_seconds": time.perf_counter() - wall,
+            "cpu_seconds": cpu_seconds() - cpu,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        previous = self.results.get(name)
+        if previous is None or result["wall_seconds"] < previous["wall_seconds"]:
+            self.results[name] = result
+
+
+def startup(stages: Stages) -> typing.List[str]:
+    """Time "stravaviz --help" in a new interpreter; it imports all the command line needs before parsing arguments.
+
+    Returns:
+        The modules of HEAVY_MODULES it imports.
+    """
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(stravaviz.__file__))))
+    with stages.stage("startup"):
+        subprocess.run(
+            [sys.executable, "-m", "stravaviz.cli", "--help"], env=env, stdout=subprocess.DEVNULL, check=True
+        )
+    # with -X importtime, every imported module is listed on stderr as "import time: self | cumulative | name"
+    imports = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "stravaviz.cli", "--help"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    ).stderr
+    imported = {
+        line.rsplit("|", 1)[-1].strip().split(".")[0]
+        for line in imports.splitlines()
+        if line.startswith("import time:")
+    }
+    return [name for name in HEAVY_MODULES if name in imported]
+
+
+def run_once(stages: Stages, corpus: str, work_dir: str, jobs: int, parser: str) -> typing.Dict[str, int]:
+    """Run all stages once on the corpus; returns counts describing the work done.
+
+    The parse, build and simplify stages are the steps of loading a track with the given parser, run one after
+    the other in this process; the load stage runs them all with the loader's worker processes and stores the
+    cache.
+    """
+    counts: typing.Dict[str, int] = {}
+    loader = TrackLoader()
+    loader.jobs = jobs
+    loader.parser = parser
+
+    with stages.stage("list"):
+        stamps = loader.list_track_files(corpus)
+    counts["files"] = len(stamps)
+
+    with stages.stage("parse"):
+        parsed = []
+        for file_name in stamps:
+            with track_files.open_track_file(file_name) as f:
+                if parser == "fast":
+                    parsed.append(gpx_reader.read_gpx(f))
+                else:
+                    parsed.append(gpxpy.parse(io.TextIOWrapper(f, encoding="utf-8")))
+    if parser == "fast":
+        counts["points"] = sum(len(lats) for gpx in parsed for lats, _, _ in gpx.segments)
+    else:
+        counts["points"] = sum(len(s.points) for gpx in parsed for tr in gpx.tracks for s in tr.segments)
+
+    with stages.stage("build"):
+        built = []
+        for gpx in parsed:
+            # the same step as in Track.load_file, which has no public entry point taking a parsed document
+            t = Track()
+            if parser == "fast":
+                t._load_streamed_gpx_data(gpx)  # pylint: disable=protected-access
+            else:
+                t._load_gpx_data(gpx)  # pylint: disable=protected-access
+            built.append(t)
+    del parsed
+
+    with stages.stage("simplify"):
+        for t in built:
+            t.simplify(DEFAULT_SIMPLIFY_TOLERANCE)
+    counts["simplified_points"] = sum(len(t.lats) for t in built)
+    del built
+
+    loader.cache_dir = os.path.join(work_dir, "cache")
+    with stages.stage("load"):
+        loaded = loader.load_track_files(stamps)
+    with stages.stage("load_cached"):
+        loaded = loader.load_track_files(stamps)
+
+    with stages.stage("filter_merge"):
+        tracks = loader.filter_and_merge_tracks(list(loaded.values()))
+    counts["tracks"] = len(tracks)
+
+    d = Drawer()
+    d.set_tracks(tracks)
+    with stages.stage("layout"):
+        artifacts = SharedArtifacts(tracks)
+        artifacts.grid_layout(d.content_size())
+
+    with stages.stage("project"):
+        bbox = artifacts.bbox()
+        counts["projected_points"] = sum(
+            len(line)
+            for tr in tracks
+            for line in utils.project_segments(bbox, d.content_size(), XY(10, 10), tr.lats, tr.lngs, tr.offsets)
+        )
+
+    for name, drawer_class in (("facets", GridDrawer), ("elevations", ElevationsDrawer), ("heatmap", HeatmapDrawer)):
+        output = os.path.join(work_dir, f"{name}.svg")
+        with stages.stage(f"draw_{name}"):
+            d.draw(drawer_class(tracks, RenderOptions(), artifacts), output)
+        counts[f"{name}_bytes"] = os.path.getsize(output)
+    return counts
+
+
+def git_revision() -> typing.Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, cwd=os.path.dirname(__file__)
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: typing.Dict[str, typing.Any], results: typing.Dict[str, typing.Any]) -> None:
+    """Print wall times of both results per stage, with the ratio current / baseline (to stderr)."""
+    print(f"{'stage':<16}{'baseline':>12}{'current':>12}{'ratio':>8}", file=sys.stderr)
+    for name, current in results["stages"].items():
+        before = baseline["stages"].get(name)
+        if before is None:
+            print(f"{name:<16}{'-':>12}{current['wall_seconds']:>11.3f}s{'-':>8}", file=sys.stderr)
+            continue
+        ratio = current["wall_seconds"] / before["wall_seconds"] if before["wall_seconds"] > 0 else float("inf")
+        print(
+            f"{name:<16}{before['wall_seconds']:>11.3f}s{current['wall_seconds']:>11.3f}s{ratio:>8.2f}", file=sys.stderr
+        )
+    if baseline.get("parameters") != results.get("parameters"):
+        print("Warning: the results were measured with different parameters.", file=sys.stderr)
+
+
+def main() -> None:
+    args_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    args_parser.add_argument("--activities", type=int, default=generate.DEFAULT_ACTIVITIES)
+    args_parser.add_argument("--points", type=int, default=generate.DEFAULT_POINTS, help="Points per activity.")
+    args_parser.add_argument(
+        "--interval", type=float, default=generate.DEFAULT_INTERVAL, help="Seconds between two points."
+    )
+    args_parser.add_argument(
+        "--spread", type=float, default=generate.DEFAULT_SPREAD, help="Radius (km) within which activities start."
+    )
+    args_parser.add_argument("--seed", type=int, default=0)
+    args_parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Worker processes for loading.")
+    args_parser.add_argument("--parser", choices=["gpxpy", "fast"], default="gpxpy", help="GPX parser for loading.")
+    args_parser.add_argument("--repeat", type=int, default=1, help="Run all stages this many times.")
+    args_parser.add_argument("--corpus", metavar="PATH", help="Use this directory or zip archive of activities.")
+    args_parser.add_argument("--output", metavar="FILE", help="Write the results to FILE (default: stdout).")
+    args_parser.add_argument("--compare", metavar="FILE", help="Compare the results with earlier results.")
+    args_parser.add_argument(
+        "--max-startup",
+        type=float,
+        default=MAX_STARTUP_SECONDS,
+        metavar="SECONDS",
+        help="Fail if the startup stage takes longer.",
+    )
+    args = args_parser.parse_args()
+
+    parameters: typing.Dict[str, typing.Any] = {"jobs": args.jobs, "parser": args.parser, "repeat": args.repeat}
+    stages = Stages()
+    with tempfile.TemporaryDirectory(prefix="stravaviz-benchmark-") as tmp_dir:
+        corpus = args.corpus
+        if corpus is None:
+            corpus = os.path.join(tmp_dir, "corpus")
+            generate.generate_corpus(corpus, args.activities, args.points, args.interval, args.spread, seed=args.seed)
+            parameters.update(
+                activities=args.activities,
+                points=args.points,
+                interval=args.interval,
+                spread=args.spread,
+                seed=args.seed,
+            )
+        else:
+            parameters["corpus"] = os.path.abspath(corpus)
+        for i in range(args.repeat):
+            work_dir = os.path.join(tmp_dir, f"run{i}")
+            os.makedirs(work_dir)
+            heavy_imports = startup(stages)
+            counts = run_once(stages, corpus, work_dir, args.jobs, args.parser)
+
+    results = {
+        "schema": SCHEMA,
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parameters": parameters,
+        "counts": counts,
+        "stages": stages.results,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+    # fail on startup regressions, after the results are written
+    if heavy_imports:
+        sys.exit(f"Startup regression: stravaviz --help imports {', '.join(heavy_imports)}.")
+    if stages.results["startup"]["wall_seconds"] > args.max_startup:
+        sys.exit(
+            f"Startup regression: stravaviz --help took {stages.results['startup']['wall_seconds']:.2f}s "
+            f"(at most {args.max_startup:.2f}s allowed)."
+        )
+
+
+if __name__ == "__main__":
+    main()
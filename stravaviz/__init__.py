@@ -0,0 +1,2 @@
+__app_name__ = "stravaviz"
+__app_author__ = "matoous"
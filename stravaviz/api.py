@@ -0,0 +1,112 @@
+"""Load tracks and render images in memory, for embedding stravaviz into other programs (e.g. a web service).
+
+Nothing here reads or writes files by name or keeps global state: activities are passed as bytes or file objects,
+images are written to file objects or returned as bytes. A process can load its tracks once and render them many
+times, also from several threads at once.
+
+Example:
+    tracks = api.load_tracks({"ride.gpx": gpx_bytes})
+    svg = api.render_bytes(tracks, "heatmap", RenderOptions(heatmap_center=(50.08, 14.42), heatmap_radius=10))
+"""
+
+import io
+import logging
+import typing
+
+from stravaviz.artifacts import SharedArtifacts
+from stravaviz.drawer import Drawer
+from stravaviz.exceptions import ParameterError, TrackLoadError
+from stravaviz.heatmap_drawer import HeatmapDrawer
+from stravaviz.options import RenderOptions
+from stravaviz.render_pipeline import DRAWERS, OUTPUTS
+from stravaviz.track import Track
+from stravaviz.track_loader import TrackLoader
+
+log = logging.getLogger(__name__)
+
+
+def load_tracks(
+    files: typing.Mapping[str, typing.Union[bytes, typing.BinaryIO]], loader: typing.Optional[TrackLoader] = None
+) -> typing.List[Track]:
+    """Load activities given as file name -> contents, then filter and merge them like TrackLoader.load_tracks.
+
+    The format of each activity follows from its file name (see track_files.SUFFIXES). Activities that fail to
+    load are logged and left out.
+
+    Args:
+        files: Contents of the activity files (bytes or binary file objects) by file name.
+        loader: Loader whose settings (parser, simplification, year range, merge gap, ...) are used; defaults
+            if None. Its cache directory is not used.
+    """
+    loader = loader if loader is not None else TrackLoader()
+    tracks = []
+    for file_name, data in files.items():
+        t = Track()
+        try:
+            t.load_stream(
+                io.BytesIO(data) if isinstance(data, bytes) else data,
+                file_name,
+                loader.parser,
+                loader.simplify_tolerance,
+            )
+        except TrackLoadError as e:
+            log.error("Error while loading %s: %s", file_name, str(e))
+            continue
+        tracks.append(t)
+    return loader.filter_and_merge_tracks(tracks)
+
+
+def media_type(output: str, options: typing.Optional[RenderOptions] = None) -> str:
+    """Return the media type of an output: "image/png" for a PNG heatmap, else "image/svg+xml"."""
+    if output == "heatmap" and options is not None and options.heatmap_format == "png":
+        return "image/png"
+    return "image/svg+xml"
+
+
+def render(
+    tracks: typing.List[Track],
+    output: str,
+    file: typing.BinaryIO,
+    options: typing.Optional[RenderOptions] = None,
+    artifacts: typing.Optional[SharedArtifacts] = None,
+) -> None:
+    """Render an output of the tracks into a binary file object (see media_type for its format).
+
+    Args:
+        tracks: Tracks to draw.
+        output: Name of the output (see render_pipeline.OUTPUTS).
+        file: File object the image is written to; it is left open.
+        options: Options of the image (defaults if None).
+        artifacts: Data derived from the same tracks, to share it between renders (computed if None).
+
+    Raises:
+        ParameterError: The output is unknown or the options are invalid.
+    """
+    if output not in DRAWERS:
+        raise ParameterError(f"Not a valid output: {output} (choose from {','.join(OUTPUTS)})")
+    options = options if options is not None else RenderOptions()
+    tracks_drawer = DRAWERS[output](tracks, options, artifacts)
+    drawer = Drawer()
+    drawer.set_options(options)
+    if isinstance(tracks_drawer, HeatmapDrawer) and options.heatmap_format == "png":
+        drawer.draw_png(tracks_drawer, file, options.heatmap_pixels, options.heatmap_scale)
+        return
+    text_file = io.TextIOWrapper(file, encoding="utf-8")
+    try:
+        drawer.draw(tracks_drawer, text_file)
+        text_file.flush()
+    finally:
+        # leave the file open for the caller
+        text_file.detach()
+
+
+def render_bytes(
+    tracks: typing.List[Track],
+    output: str,
+    options: typing.Optional[RenderOptions] = None,
+    artifacts: typing.Optional[SharedArtifacts] = None,
+) -> bytes:
+    """Render an output of the tracks and return the image (see render)."""
+    file = io.BytesIO()
+    render(tracks, output, file, options, artifacts)
+    return file.getvalue()
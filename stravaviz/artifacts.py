@@ -0,0 +1,96 @@
+import threading
+import typing
+
+import numpy as np
+import s2sphere  # type: ignore
+
+from stravaviz import spatial_index, utils
+from stravaviz.exceptions import DrawerError
+from stravaviz.track import Track
+from stravaviz.xy import XY
+
+
+class GridLayout:
+    """Layout of equally sized, equally spaced square cells filling an area (one cell per track).
+
+    Attributes:
+        cell_size: Width and height of a cell.
+        count_x: Number of columns.
+        count_y: Number of rows.
+        spacing: Horizontal and vertical space between cells.
+        margin: Offset of the first cell that centers the grid within the area.
+
+    Methods:
+        cell: Return size and offset of the drawing area of a cell.
+    """
+
+    def __init__(self, count: int, size: XY) -> None:
+        cell_size, counts = utils.compute_grid(count, size)
+        if cell_size is None or counts is None:
+            raise DrawerError("Unable to compute grid.")
+        self.cell_size = cell_size
+        self.count_x, self.count_y = counts[0], counts[1]
+        self.spacing = XY(
+            0 if self.count_x <= 1 else (size.x - cell_size * self.count_x) / (self.count_x - 1),
+            0 if self.count_y <= 1 else (size.y - cell_size * self.count_y) / (self.count_y - 1),
+        )
+        self.margin = XY(
+            (size.x - self.count_x * cell_size - (self.count_x - 1) * self.spacing.x) / 2,
+            (size.y - self.count_y * cell_size - (self.count_y - 1) * self.spacing.y) / 2,
+        )
+
+    def cell(self, index: int, offset: XY) -> typing.Tuple[XY, XY]:
+        """Return size and offset of the drawing area (90% of the cell) of the index-th cell of a grid at offset."""
+        cell = XY(self.cell_size, self.cell_size)
+        p = XY(index % self.count_x, index // self.count_x) * (cell + self.spacing)
+        return 0.9 * cell, offset + self.margin + 0.05 * cell + p
+
+
+class SharedArtifacts:
+    """Data derived from the tracks that several drawers need; computed once and shared by all outputs.
+
+    Attributes:
+        tracks: Tracks the artifacts were computed from.
+        tracks_by_year: Indices of the tracks grouped by the year they started in, in order of the first track
+            of each year.
+        min_ele: Lowest elevation of all tracks.
+        max_ele: Highest elevation of all tracks.
+        bounds: Border box of all tracks (see spatial_index.Rect).
+
+    Methods:
+        bbox: Return the border box of all tracks.
+        grid_layout: Return the grid layout of the tracks for a given area.
+        track_index: Return the spatial index of the tracks.
+    """
+
+    def __init__(self, tracks: typing.List[Track]) -> None:
+        self.tracks = tracks
+        self.tracks_by_year: typing.Dict[int, typing.List[int]] = {}
+        for index, tr in enumerate(tracks):
+            self.tracks_by_year.setdefault(tr.start_time().year, []).append(index)
+        elevations = np.concatenate([tr.eles for tr in tracks]) if tracks else np.empty(0)
+        elevations = elevations[np.isfinite(elevations)]
+        self.min_ele = float(elevations.min()) if len(elevations) > 0 else 0.0
+        self.max_ele = float(elevations.max()) if len(elevations) > 0 else 0.0
+        self.bounds = spatial_index.union(np.array([tr.bounds() for tr in tracks]).reshape(-1, 4))
+        self._grid_layouts: typing.Dict[typing.Tuple[float, float], GridLayout] = {}
+        self._track_index: typing.Optional[spatial_index.TrackIndex] = None
+        self._lock = threading.Lock()
+
+    def bbox(self) -> s2sphere.LatLngRect:
+        """Return the smallest rectangle that contains all tracks."""
+        return spatial_index.latlngrect_from_rect(self.bounds)
+
+    def grid_layout(self, size: XY) -> GridLayout:
+        """Return the grid layout (one cell per track) filling an area of the given size."""
+        with self._lock:
+            if size.tuple() not in self._grid_layouts:
+                self._grid_layouts[size.tuple()] = GridLayout(len(self.tracks), size)
+            return self._grid_layouts[size.tuple()]
+
+    def track_index(self) -> spatial_index.TrackIndex:
+        """Return the spatial index of the tracks (indices as in tracks), built on first use."""
+        with self._lock:
+            if self._track_index is None:
+                self._track_index = spatial_index.TrackIndex(self.tracks)
+            return self._track_index
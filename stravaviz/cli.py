@@ -1,26 +1,43 @@
 #!/usr/bin/env python
 
 import argparse
+import json
 import logging
+import os
 import sys
-from os.path import join
+import typing
 from pathlib import Path
 
-from stravaviz import drawer, track_loader, grid_drawer, heatmap_drawer, elevations_drawer
+import appdirs  # type: ignore
+
+from stravaviz import __app_name__, __app_author__
+# only light modules are imported here, so --help and invalid arguments are fast; the modules doing the work
+# (and numpy, s2sphere, gpxpy, ...) are imported once the arguments are parsed
+from stravaviz import defaults, options, profiling
 from stravaviz.exceptions import ParameterError, DrawerError
 
+if typing.TYPE_CHECKING:
+    from stravaviz.track_loader import TrackLoader
 
-def main() -> None:
-    d = drawer.Drawer()
 
+def main() -> None:
     args_parser = argparse.ArgumentParser(prog="stravaviz")
+    args_parser.add_argument(
+        "command",
+        nargs="?",
+        choices=["render", "watch", "serve"],
+        default="render",
+        help='"render" creates the images once (default), "watch" keeps updating them as GPX files are added, '
+        'changed or deleted, "serve" keeps the tracks loaded and renders images on HTTP requests.',
+    )
     args_parser.add_argument(
         "--gpx-dir",
         dest="gpx_dir",
         metavar="DIR",
         type=str,
         default=".",
-        help="Directory containing GPX files (default: current directory).",
+        help="Directory or zip archive (e.g. a Strava bulk export) containing GPX or FIT files, which may be gzipped "
+        "(default: current directory).",
     )
     args_parser.add_argument(
         "--output",
@@ -36,15 +53,136 @@ def main() -> None:
         default="all",
         help='Filter tracks by year; "NUM", "NUM-NUM", "all" (default: all years)',
     )
-    args = args_parser.add_argument_group("Heatmap Type Options")
-    args.add_argument(
+    args_parser.add_argument(
+        "--cache-dir",
+        dest="cache_dir",
+        metavar="DIR",
+        type=str,
+        default=appdirs.user_cache_dir(__app_name__, __app_author__),
+        help="Directory used to cache parsed GPX files (default: user cache directory).",
+    )
+    args_parser.add_argument(
+        "--parser",
+        choices=["gpxpy", "fast"],
+        default="gpxpy",
+        help='GPX parser; "fast" streams only the track points instead of building the whole document with gpxpy '
+        "(default: gpxpy).",
+    )
+    args_parser.add_argument(
+        "--jobs",
+        metavar="N",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of processes parsing activity files; 1 parses them without starting worker processes "
+        "(default: number of CPUs).",
+    )
+    args_parser.add_argument(
+        "--batch-size",
+        dest="batch_size",
+        metavar="FILES",
+        type=int,
+        help="Number of activity files a worker process parses at a time (default: automatic).",
+    )
+    args_parser.add_argument(
+        "--merge-gap",
+        dest="merge_gap",
+        metavar="MINUTES",
+        type=float,
+        default=defaults.MERGE_GAP / 60,
+        help="Merge tracks that start less than MINUTES after the end of the previous track, or overlap it in time, "
+        f"into one track (default: {defaults.MERGE_GAP / 60:g}).",
+    )
+    args_parser.add_argument(
+        "--simplify-tolerance",
+        dest="simplify_tolerance",
+        metavar="METERS",
+        type=float,
+        default=defaults.SIMPLIFY_TOLERANCE,
+        help=f"Simplify tracks such that no point is dropped if it is farther than METERS from the simplified track "
+        f"(default: {defaults.SIMPLIFY_TOLERANCE:g}).",
+    )
+    args_parser.add_argument(
+        "--outputs",
+        metavar="NAME[,NAME...]",
+        type=str,
+        default=",".join(defaults.OUTPUTS),
+        help=f"Comma separated list of images to create, out of {', '.join(defaults.OUTPUTS)} "
+        f"(default: all).",
+    )
+    args_parser.add_argument(
+        "--precision",
+        metavar="DIGITS",
+        type=int,
+        default=defaults.PRECISION,
+        help=f"Number of decimal places of coordinates in SVG images (default: {defaults.PRECISION}).",
+    )
+    args_parser.add_argument(
+        "--merge-paths",
+        dest="merge_paths",
+        action="store_true",
+        help="Write all tracks of a year as a single path with relative coordinates; SVG images look the same, "
+        "but are smaller and open faster.",
+    )
+    args_parser.add_argument(
+        "--interval",
+        metavar="SECONDS",
+        type=float,
+        default=defaults.WATCH_INTERVAL,
+        help="Time between two checks of the GPX directory in watch and serve mode "
+        f"(default: {defaults.WATCH_INTERVAL:g}).",
+    )
+    args_parser.add_argument(
+        "--elevation-axis",
+        dest="elevation_axis",
+        choices=defaults.ELEVATION_AXES,
+        default="distance",
+        help='Draw elevation profiles over the distance or the elapsed time, or space the points evenly ("index") '
+        "(default: distance).",
+    )
+    args_parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        nargs="?",
+        const="",
+        help="Report the time spent in each stage, the slowest files and counts of points and SVG elements; "
+        "printed after rendering, or written to FILE as JSON.",
+    )
+    serve_args = args_parser.add_argument_group("Serve Options")
+    serve_args.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="Address to listen on for HTTP requests (default: 127.0.0.1).",
+    )
+    serve_args.add_argument(
+        "--port",
+        type=int,
+        default=defaults.SERVE_PORT,
+        help=f"Port to listen on for HTTP requests (default: {defaults.SERVE_PORT}).",
+    )
+    serve_args.add_argument(
+        "--socket",
+        metavar="PATH",
+        type=str,
+        help="Listen on a unix socket instead of a TCP port.",
+    )
+    serve_args.add_argument(
+        "--cache-size",
+        dest="cache_size",
+        metavar="IMAGES",
+        type=int,
+        default=defaults.SERVE_CACHE_SIZE,
+        help=f"Number of rendered images kept in memory (default: {defaults.SERVE_CACHE_SIZE}).",
+    )
+    heatmap_args = args_parser.add_argument_group("Heatmap Type Options")
+    heatmap_args.add_argument(
             "--heatmap-center",
             dest="heatmap_center",
             metavar="LAT,LNG",
             type=str,
             help="Center of the heatmap (default: automatic).",
     )
-    args.add_argument(
+    heatmap_args.add_argument(
             "--heatmap-radius",
             dest="heatmap_radius",
             metavar="RADIUS_KM",
@@ -52,26 +190,130 @@ def main() -> None:
             help="Scale the heatmap such that at least a circle with radius=RADIUS_KM is visible "
                  "(default: automatic).",
     )
+    heatmap_args.add_argument(
+            "--heatmap-format",
+            dest="heatmap_format",
+            choices=options.HEATMAP_FORMATS,
+            default="svg",
+            help='Draw the heatmap as vector tracks ("svg") or as a rasterized density map ("png") (default: svg).',
+    )
+    heatmap_args.add_argument(
+            "--heatmap-pixels",
+            dest="heatmap_pixels",
+            metavar="PIXELS",
+            type=int,
+            default=3000,
+            help="Width and height of the PNG heatmap in pixels (default: 3000).",
+    )
+    heatmap_args.add_argument(
+            "--tiles",
+            metavar="Z_MIN-Z_MAX",
+            type=str,
+            help="Also render the heatmap as slippy map tiles (OUTPUT/tiles/Z/X/Y.png) for the given zoom levels; "
+                 "rerunning only updates tiles affected by added, changed or removed tracks.",
+    )
+    heatmap_args.add_argument(
+            "--heatmap-scale",
+            dest="heatmap_scale",
+            choices=options.HEATMAP_SCALES,
+            default="log",
+            help="Color ramp of the PNG heatmap; logarithmic or histogram-equalized density (default: log).",
+    )
 
     args = args_parser.parse_args()
 
     log = logging.getLogger("stravaviz")
     log.setLevel(logging.INFO)
 
-    loader = track_loader.TrackLoader()
-    if not loader.year_range.parse(args.year):
-        raise ParameterError(f"Bad year range: {args.year}.")
+    profiler = None
+    if args.profile is not None:
+        if args.command != "render":
+            raise ParameterError(f"--profile is not supported in {args.command} mode.")
+        profiler = profiling.enable()
 
-    tracks = loader.load_tracks(args.gpx_dir)
-    if not tracks:
+    # pylint: disable=import-outside-toplevel
+    from stravaviz import drawer, render_pipeline, tiles, track_loader
+
+    d = drawer.Drawer()
+    loader = _create_loader(args)
+    outputs = render_pipeline.parse_outputs(args.outputs)
+    render_options = options.RenderOptions(
+        precision=args.precision,
+        merge_paths=args.merge_paths,
+        elevation_axis=args.elevation_axis,
+        heatmap_center=options.parse_lat_lng(args.heatmap_center) if args.heatmap_center else None,
+        heatmap_radius=args.heatmap_radius,
+        heatmap_format=args.heatmap_format,
+        heatmap_pixels=args.heatmap_pixels,
+        heatmap_scale=args.heatmap_scale,
+    )
+    render_options.validate()
+    d.set_options(render_options)
+    zoom_range = tiles.parse_zoom_range(args.tiles) if args.tiles else None
+
+    if args.command in ("watch", "serve") and args.interval <= 0:
+        raise ParameterError(f"Not a valid interval: {args.interval} (must be > 0)")
+
+    if args.command == "serve":
+        if args.cache_size <= 0:
+            raise ParameterError(f"Not a valid cache size: {args.cache_size} (must be > 0)")
+        from stravaviz import server  # pylint: disable=import-outside-toplevel
+
+        # all tracks are kept, --year is only the default of requests
+        loader.year_range.parse("all")
+        track_set = track_loader.TrackSet(loader, args.gpx_dir)
+        render_server = server.RenderServer(track_set, render_options, args.year, args.interval, args.cache_size)
+        server.serve(render_server, args.host, args.port, args.socket)
         return
 
-    print(f"Creating images for {len(tracks)} tracks and storing them in directory '{args.output}'...")
-    Path(args.output).mkdir(parents=True, exist_ok=True)
-    d.set_tracks(tracks)
-    d.draw(grid_drawer.GridDrawer(d.tracks, args), join(args.output, "facets.svg"))
-    d.draw(elevations_drawer.ElevationsDrawer(d.tracks, args), join(args.output, "elevations.svg"))
-    d.draw(heatmap_drawer.HeatmapDrawer(d.tracks, args), join(args.output, "heatmap.svg"))
+    if args.command == "watch":
+        from stravaviz import watcher  # pylint: disable=import-outside-toplevel
+
+        watcher.Watcher(
+            loader, d, args.gpx_dir, args.output, render_options, outputs, tiles=zoom_range
+        ).run(args.interval)
+        return
+
+    with profiling.stage("total"):
+        tracks = loader.load_tracks(args.gpx_dir)
+        if not tracks:
+            return
+
+        print(f"Creating images for {len(tracks)} tracks and storing them in directory '{args.output}'...")
+        Path(args.output).mkdir(parents=True, exist_ok=True)
+        d.set_tracks(tracks)
+        results = render_pipeline.RenderPipeline(d, render_options, outputs, tile_zooms=zoom_range).render(args.output)
+    if "tiles" in results:
+        print(f"Rendered {results['tiles']} tile(s).")
+    if profiler is not None:
+        if args.profile:
+            with open(args.profile, "w", encoding="utf-8") as f:
+                json.dump(profiler.to_json(), f, indent=2)
+        else:
+            print(profiler.summary(), file=sys.stderr)
+
+
+def _create_loader(args: argparse.Namespace) -> "TrackLoader":
+    from stravaviz.track_loader import TrackLoader  # pylint: disable=import-outside-toplevel
+
+    loader = TrackLoader()
+    loader.cache_dir = args.cache_dir
+    loader.parser = args.parser
+    if args.jobs <= 0:
+        raise ParameterError(f"Not a valid number of jobs: {args.jobs} (must be > 0)")
+    loader.jobs = args.jobs
+    if args.batch_size is not None and args.batch_size <= 0:
+        raise ParameterError(f"Not a valid batch size: {args.batch_size} (must be > 0)")
+    loader.batch_size = args.batch_size
+    if args.simplify_tolerance <= 0:
+        raise ParameterError(f"Not a valid simplification tolerance: {args.simplify_tolerance} (must be > 0)")
+    loader.simplify_tolerance = args.simplify_tolerance
+    if args.merge_gap < 0:
+        raise ParameterError(f"Not a valid merge gap: {args.merge_gap} (must be >= 0)")
+    loader.merge_gap = args.merge_gap * 60
+    if not loader.year_range.parse(args.year):
+        raise ParameterError(f"Bad year range: {args.year}.")
+    return loader
 
 
 if __name__ == "__main__":
@@ -80,3 +322,5 @@ if __name__ == "__main__":
     except DrawerError as e:
         print(e)
         sys.exit(1)
+    except KeyboardInterrupt:
+        sys.exit(130)
@@ -0,0 +1,23 @@
+"""Defaults shared by the command line and the modules using them.
+
+This module imports nothing, so the command line can build its help texts without importing numpy and the
+drawers; the modules the defaults belong to import them from here.
+"""
+
+# Outputs that can be rendered, in the order they are listed in help texts.
+OUTPUTS = ("facets", "elevations", "heatmap")
+# Quantities elevation profiles can be drawn over.
+ELEVATION_AXES = ("distance", "time", "index")
+# Default largest distance (meters) of a dropped point from the simplified track (the same as gpxpy's default).
+SIMPLIFY_TOLERANCE = 10.0
+# Default largest time (seconds) between the end of a track and the start of the next one to merge them.
+MERGE_GAP = 3600.0
+# Default shortest length (meters) of a track; shorter tracks are dropped.
+MIN_LENGTH = 1000.0
+# Number of decimal places of coordinates written by default.
+PRECISION = 2
+# Default time (seconds) between two checks of the GPX directory.
+WATCH_INTERVAL = 1.0
+# Default port and number of cached images of the render server.
+SERVE_PORT = 8000
+SERVE_CACHE_SIZE = 64
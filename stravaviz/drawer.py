@@ -1,14 +1,16 @@
 from collections import defaultdict
 import logging
+import os
 import typing
 
-import pint  # type: ignore
-import svgwrite  # type: ignore
-
+from stravaviz import profiling, raster
+from stravaviz.options import RenderOptions
+from stravaviz.svg_writer import DEFAULT_PRECISION, SvgWriter
 from stravaviz.track import Track
 from stravaviz.xy import XY
 from stravaviz.year_range import YearRange
 from stravaviz.tracks_drawer import TracksDrawer  # pylint: disable=cyclic-import
+from stravaviz.heatmap_drawer import HeatmapDrawer  # pylint: disable=cyclic-import
 
 
 log = logging.getLogger(__name__)
@@ -23,30 +25,47 @@ class Drawer:
         units: Length units to be used in images.
         width: Poster width.
         height: Poster height.
+        precision: Number of decimal places of coordinates in SVG images (all if None).
+        merge_paths: Write all tracks of a year as a single path in SVG images.
         years: Years included in the images.
-        tracks_drawer: drawer used to draw the final image.
 
     Methods:
+        set_options: Take image size, colors and SVG settings from render options.
         set_tracks: Associate the Poster with a set of tracks
         draw: Draw the tracks on the image.
+        content_size: Size of the area the tracks are drawn into.
+        draw_png: Draw the heatmap as density raster into a PNG image.
         u: Return distance unit (km or mi)
     """
 
     def __init__(self) -> None:
         self.tracks_by_date: typing.Dict[str, typing.List[Track]] = defaultdict(list)
         self.tracks: typing.List[Track] = []
-        self.total_length_year_dict: typing.Dict[int, pint.quantity.Quantity] = defaultdict(int)
+        # total length (meters) by year
+        self.total_length_year_dict: typing.Dict[int, float] = defaultdict(float)
         self.units = "metric"
         self.colors = {
             "background": "#FFFFFF",
             "track": "#000000",
         }
-        self.width = 300
-        self.height = 300
+        self.width: float = 300
+        self.height: float = 300
+        self.precision: typing.Optional[int] = DEFAULT_PRECISION
+        self.merge_paths = False
         self.years = YearRange()
-        self.tracks_drawer: typing.Optional["TracksDrawer"] = None
         self._trans: typing.Optional[typing.Callable[[str], str]] = None
 
+    def set_options(self, options: RenderOptions) -> None:
+        """Take image size, colors and SVG settings from options."""
+        self.width = options.width
+        self.height = options.height
+        self.colors = {
+            "background": options.background_color,
+            "track": options.track_color,
+        }
+        self.precision = options.precision
+        self.merge_paths = options.merge_paths
+
     def set_tracks(self, tracks: typing.List[Track]) -> None:
         """Associate the set of tracks with this drawer.
 
@@ -62,22 +81,60 @@ class Drawer:
             text_date = track.start_time().strftime("%Y-%m-%d")
             self.tracks_by_date[text_date].append(track)
 
-    def draw(self, drawer: "TracksDrawer", output: str) -> None:
-        """Set the Poster's drawer and draw the tracks."""
-        self.tracks_drawer = drawer
-        d = svgwrite.Drawing(output, (f"{self.width}mm", f"{self.height}mm"))
-        d.viewbox(0, 0, self.width, self.height)
-        d.add(d.rect((0, 0), (self.width, self.height), fill=self.colors["background"]))
-        self._draw_tracks(d, XY(self.width - 20, self.height - 20), XY(10, 10))
-        d.save()
+    def draw(self, drawer: "TracksDrawer", output: typing.Union[str, typing.TextIO]) -> None:
+        """Draw the tracks with the given drawer into an SVG image (a file name or a text file object).
 
-    def _draw_tracks(self, d: svgwrite.Drawing, size: XY, offset: XY) -> None:
-        assert self.tracks_drawer
-
-        g = d.g(id="tracks")
-        d.add(g)
-
-        self.tracks_drawer.draw(d, g, size, offset)
+        The Drawer itself is not modified, so several outputs can be drawn concurrently.
+        """
+        if isinstance(output, str):
+            with open(output, "w", encoding="utf-8") as f:
+                self.draw(drawer, f)
+            if profiling.enabled():
+                profiling.count(f"{os.path.basename(output)} bytes", os.path.getsize(output))
+            return
+        with SvgWriter(output, self.width, self.height, precision=self.precision, merge_paths=self.merge_paths) as svg:
+            svg.rect(0, 0, self.width, self.height, fill=self.colors["background"])
+            self._draw_tracks(drawer, svg, self.content_size(), XY(10, 10))
+        name = os.path.basename(str(getattr(output, "name", type(drawer).__name__)))
+        profiling.count(f"{name} elements", svg.elements)
+        profiling.count(f"{name} lines", svg.lines)
+        profiling.count(f"{name} points", svg.points)
+
+    def content_size(self) -> XY:
+        """Size of the area the tracks are drawn into (the image without margins)."""
+        return XY(self.width - 20, self.height - 20)
+
+    def draw_png(
+        self, drawer: "HeatmapDrawer", output: typing.Union[str, typing.BinaryIO], pixels: int, scale: str = "log"
+    ) -> None:
+        """Rasterize the heatmap into a PNG image (a file name or a binary file object) that is pixels wide and high.
+
+        Overlapping tracks accumulate into a density that is mapped from the background to the track color,
+        using either a logarithmic ("log") or a histogram-equalized ("equalize") ramp.
+        """
+        width = pixels
+        height = round(pixels * self.height / self.width)
+        density = raster.DensityRaster(width, height)
+        margin = 10 * width / self.width
+        drawer.draw_raster(density, XY(width - 2 * margin, height - 2 * margin), XY(margin, margin))
+        image = density.colorize(self.colors["background"], self.colors["track"], scale)
+        if isinstance(output, str):
+            with open(output, "wb") as f:
+                raster.write_png(f, image)
+        else:
+            raster.write_png(output, image)
+
+    def _draw_tracks(self, drawer: "TracksDrawer", svg: SvgWriter, size: XY, offset: XY) -> None:
+        # the stroke is the same for all tracks, the tracks inherit it from their group
+        with svg.group(
+            id="tracks",
+            stroke=self.colors["track"],
+            fill="none",
+            stroke_width=0.5,
+            stroke_linejoin="round",
+            stroke_linecap="round",
+        ):
+            drawer.draw(svg, size, offset)
 
     def _compute_years(self, tracks: typing.List[Track]) -> None:
         self.years.clear()
@@ -1,82 +1,84 @@
-import argparse
 import typing
 
-import svgwrite  # type: ignore
+import numpy as np
 
+from stravaviz import defaults
+from stravaviz.artifacts import SharedArtifacts
 from stravaviz.exceptions import DrawerError
+from stravaviz.options import RenderOptions
+from stravaviz.svg_writer import SvgWriter
 from stravaviz.track import Track
 from stravaviz.tracks_drawer import TracksDrawer
 from stravaviz.xy import XY
-from stravaviz import utils
 
+AXES = defaults.ELEVATION_AXES
+# Width (mm) of the columns of elevation profiles; finer details than this are not drawn.
+COLUMN_WIDTH = 0.1
 
-class ElevationsDrawer(TracksDrawer):
-    def __init__(self, tracks: typing.List[Track], args: argparse.Namespace) -> None:
-        super().__init__(tracks, args)
-        all_elevations = []
-        for track in self.tracks:
-            for elevations in track.elevations:
-                for elevation in elevations:
-                    all_elevations.append(elevation)
 
-        all_elevations = list(filter(lambda e: type(e) == type(1.1), all_elevations))
-        self.min_ele = min(all_elevations)
-        self.max_ele = max(all_elevations)
+class ElevationsDrawer(TracksDrawer):
+    def __init__(
+        self,
+        tracks: typing.List[Track],
+        options: typing.Optional[RenderOptions] = None,
+        artifacts: typing.Optional[SharedArtifacts] = None,
+    ) -> None:
+        super().__init__(tracks, options, artifacts)
+        self.min_ele = self.artifacts.min_ele
+        self.max_ele = self.artifacts.max_ele
+        self.axis = self.options.elevation_axis
 
-    def draw(self, dr: svgwrite.Drawing, g: svgwrite.container.Group, size: XY, offset: XY) -> None:
+    def draw(self, svg: SvgWriter, size: XY, offset: XY) -> None:
         if self.tracks is None:
             raise DrawerError("No tracks to draw.")
-        cell_size, counts = utils.compute_grid(len(self.tracks), size)
-        if cell_size is None or counts is None:
-            raise DrawerError("Unable to compute grid.")
-        count_x, count_y = counts[0], counts[1]
-        spacing_x = 0 if count_x <= 1 else (size.x - cell_size * count_x) / (count_x - 1)
-        spacing_y = 0 if count_y <= 1 else (size.y - cell_size * count_y) / (count_y - 1)
-        offset.x += (size.x - count_x * cell_size - (count_x - 1) * spacing_x) / 2
-        offset.y += (size.y - count_y * cell_size - (count_y - 1) * spacing_y) / 2
-        year_groups: typing.Dict[int, svgwrite.container.Group] = {}
-
-        for (index, tr) in enumerate(self.tracks):
-            year = tr.start_time().year
-            if year not in year_groups:
-                g_year = dr.g(id=f"year{year}")
-                g.add(g_year)
-                year_groups[year] = g_year
-            else:
-                g_year = year_groups[year]
-            p = XY(index % count_x, index // count_x) * XY(cell_size + spacing_x, cell_size + spacing_y)
-            self._draw_track(
-                dr,
-                g_year,
-                tr,
-                0.9 * XY(cell_size, cell_size),
-                offset + 0.05 * XY(cell_size, cell_size) + p,
-            )
+        layout = self.artifacts.grid_layout(size)
+        for year, indices in self.artifacts.tracks_by_year.items():
+            with svg.group(id=f"year{year}"):
+                for index in indices:
+                    self._draw_track(svg, self.tracks[index], *layout.cell(index, offset))
 
-    def _draw_track(self, dr: svgwrite.Drawing, g: svgwrite.container.Group, tr: Track, size: XY, offset: XY) -> None:
+    def _draw_track(self, svg: SvgWriter, tr: Track, size: XY, offset: XY) -> None:
         szx, szy = size.tuple()
         ofx, ofy = offset.tuple()
 
-        # this code is naive, the elevations don't necessarily have to be spaced out evenly but we draw them as such
-        # it is tolerable error I wasn't willing to fix
-        elevations = []
-        for els in tr.elevations:
-            for elv in els:
-                elevations.append(elv)
+        valid = np.isfinite(tr.eles)
+        if self.axis == "time":
+            valid &= np.isfinite(tr.times)
+        elevations = tr.eles[valid]
+        if len(elevations) == 0:
+            return
+        # position of each elevation along the x axis, from 0 to 1
+        positions = np.arange(len(elevations)) / len(elevations)
+        if self.axis != "index":
+            along = (tr.dists if self.axis == "distance" else tr.times)[valid]
+            span = along.max() - along.min()
+            if span > 0:
+                positions = (along - along.min()) / span
+        indices = profile_indices(elevations, positions, max(int(szx / COLUMN_WIDTH), 1))
+
+        elevation_scaling = (self.max_ele - self.min_ele) or 1.0
+        line = np.empty((len(indices), 2), dtype=np.float64)
+        line[:, 0] = szx * positions[indices] + ofx
+        line[:, 1] = szy - (elevations[indices] - self.min_ele) / elevation_scaling * szy + ofy
+        svg.path([line])
+
 
-        elevations = list(filter(lambda e: type(e) == type(1.1), elevations))
+def profile_indices(elevations: np.ndarray, positions: np.ndarray, columns: int) -> np.ndarray:
+    """Return indices of the elevations to draw a profile that is the given number of columns wide.
 
-        line = []
-        for i, elevation in enumerate(elevations):
-            elevation_scaling = self.max_ele - self.min_ele
-            e = szy - (((elevation - self.min_ele) / elevation_scaling) * szy) + ofy
-            line.append((szx / len(elevations) * i + ofx, e))
-        polyline = dr.polyline(
-            points=line,
-            stroke="#000000",
-            fill="none",
-            stroke_width=0.5,
-            stroke_linejoin="round",
-            stroke_linecap="round",
-        )
-        g.add(polyline)
+    Positions (0 to 1) place the elevations in columns. If there are more elevations than columns, the
+    elevations are split into runs of consecutive elevations in the same column, and only the lowest and the
+    highest of each run are kept (in their order), so the profile keeps all peaks and valleys while its size
+    depends on the width only.
+    """
+    if len(elevations) <= 2 * columns:
+        return np.arange(len(elevations))
+    runs = np.minimum((positions * columns).astype(np.int64), columns - 1)
+    starts = np.flatnonzero(np.diff(runs, prepend=-1))
+    run_ids = np.repeat(np.arange(len(starts)), np.diff(starts, append=len(elevations)))
+    kept = []
+    for extremes in (np.minimum.reduceat(elevations, starts), np.maximum.reduceat(elevations, starts)):
+        # first index of each run where the run's extreme is reached
+        hits = np.flatnonzero(elevations == extremes[run_ids])
+        kept.append(hits[np.unique(run_ids[hits], return_index=True)[1]])
+    return np.unique(np.concatenate(kept))
@@ -0,0 +1,222 @@
+import datetime
+import struct
+import typing
+
+import numpy as np
+
+from stravaviz import utils
+from stravaviz.exceptions import TrackLoadError
+from stravaviz.gpx_reader import StreamedGpx
+
+# Seconds from the Unix epoch to the FIT epoch (1989-12-31T00:00:00Z).
+FIT_EPOCH = 631065600
+# Global message number of records (track points).
+RECORD = 20
+TIMESTAMP = 253
+# Field number of the records' fields used, with their struct format and the value marking them as invalid.
+RECORD_FIELDS = {
+    0: ("i", 0x7FFFFFFF),  # position_lat (semicircles)
+    1: ("i", 0x7FFFFFFF),  # position_long (semicircles)
+    2: ("H", 0xFFFF),  # altitude (1/5 m, offset 500 m)
+    78: ("I", 0xFFFFFFFF),  # enhanced_altitude (1/5 m, offset 500 m)
+    TIMESTAMP: ("I", 0xFFFFFFFF),  # seconds since FIT_EPOCH
+}
+SEMICIRCLES_TO_DEGREES = 180 / 2**31
+# Bytes first read to find the start time of a file; grown (by this factor) until the time is found.
+START_CHUNK_SIZE = 16 * 1024
+START_CHUNK_GROWTH = 4
+
+
+class _Definition(typing.NamedTuple):
+    global_number: int
+    fields: typing.Tuple[int, ...]
+    struct: struct.Struct
+
+
+def _definition(
+    global_number: int, endian: str, fields: typing.List[typing.Tuple[int, int]], extra: int
+) -> _Definition:
+    """Build the struct that unpacks the used fields of a data message and skips all others."""
+    formats = []
+    numbers = []
+    for number, size in fields:
+        used = number == TIMESTAMP or (global_number == RECORD and number in RECORD_FIELDS)
+        if used and struct.calcsize(RECORD_FIELDS[number][0]) == size:
+            formats.append(RECORD_FIELDS[number][0])
+            numbers.append(number)
+        else:
+            formats.append(f"{size}x")
+    formats.append(f"{extra}x")
+    return _Definition(global_number, tuple(numbers), struct.Struct(endian + "".join(formats)))
+
+
+def _read_definition(data: bytes, pos: int, header: int) -> typing.Tuple[_Definition, int]:
+    """Decode the definition message at pos (after its header byte); returns it and the position after it."""
+    endian = ">" if data[pos + 1] else "<"
+    global_number = struct.unpack_from(endian + "H", data, pos + 2)[0]
+    count = data[pos + 4]
+    pos += 5
+    fields = [(data[pos + 3 * i], data[pos + 3 * i + 1]) for i in range(count)]
+    pos += 3 * count
+    extra = 0
+    if header & 0x20:
+        # developer fields are skipped
+        count = data[pos]
+        extra = sum(data[pos + 1 + 3 * i + 1] for i in range(count))
+        pos += 1 + 3 * count
+    return _definition(global_number, endian, fields, extra), pos
+
+
+def _compressed_timestamp(header: int, last_timestamp: typing.Optional[int]) -> typing.Optional[int]:
+    # compressed timestamp header: the low 5 bits of the time since the last full timestamp
+    if last_timestamp is None:
+        return None
+    offset = header & 0x1F
+    timestamp = (last_timestamp & ~0x1F) + offset
+    if offset < last_timestamp & 0x1F:
+        timestamp += 0x20
+    return timestamp
+
+
+def _record_point(
+    values: typing.Dict[int, typing.Any], timestamp: typing.Optional[int]
+) -> typing.Optional[typing.Tuple[typing.Optional[int], float, float, float]]:
+    """Return (timestamp, lat, lng, elevation) of a record message, or None if it has no position."""
+    lat, lng = values.get(0, RECORD_FIELDS[0][1]), values.get(1, RECORD_FIELDS[1][1])
+    if lat == RECORD_FIELDS[0][1] or lng == RECORD_FIELDS[1][1]:
+        return None
+    altitude = values.get(78, RECORD_FIELDS[78][1])
+    if altitude == RECORD_FIELDS[78][1]:
+        altitude = values.get(2, RECORD_FIELDS[2][1])
+        altitude = None if altitude == RECORD_FIELDS[2][1] else altitude
+    return (
+        timestamp,
+        lat * SEMICIRCLES_TO_DEGREES,
+        lng * SEMICIRCLES_TO_DEGREES,
+        altitude / 5 - 500 if altitude is not None else float("nan"),
+    )
+
+
+def _read_file_header(data: bytes, pos: int, partial: bool) -> typing.Tuple[int, int]:
+    """Check the file header at pos; returns the positions of the first message and of the end of the messages."""
+    header_size = data[pos]
+    if header_size < 12 or data[pos + 8 : pos + 12] != b".FIT":
+        raise TrackLoadError("Not a FIT file.")
+    end = pos + header_size + struct.unpack_from("<I", data, pos + 4)[0]
+    if end > len(data) and not partial:
+        raise TrackLoadError("Truncated FIT file.")
+    return pos + header_size, end
+
+
+def _read_points(
+    data: bytes, partial: bool = False
+) -> typing.Iterator[typing.Tuple[typing.Optional[int], float, float, float]]:
+    """Decode the records of (possibly chained) FIT files, yielding (timestamp, lat, lng, elevation) per point.
+
+    Records without a position are skipped; the timestamp is None and the elevation NaN if they are missing.
+    With partial, data is only the beginning of the files, and decoding stops (instead of failing) at its end.
+    """
+    pos = 0
+    try:
+        # trailing bytes too short to be a file header are ignored
+        while pos + 12 <= len(data):
+            pos, end = _read_file_header(data, pos, partial)
+            definitions: typing.Dict[int, _Definition] = {}
+            last_timestamp: typing.Optional[int] = None
+            while pos < end:
+                header = data[pos]
+                pos += 1
+                timestamp = None
+                if header & 0x80:
+                    local = (header >> 5) & 0x03
+                    timestamp = last_timestamp = _compressed_timestamp(header, last_timestamp)
+                elif header & 0x40:
+                    definitions[header & 0x0F], pos = _read_definition(data, pos, header)
+                    continue
+                else:
+                    local = header & 0x0F
+                definition = definitions.get(local)
+                if definition is None:
+                    raise TrackLoadError("FIT data message without definition.")
+                values = dict(zip(definition.fields, definition.struct.unpack_from(data, pos)))
+                pos += definition.struct.size
+                if values.get(TIMESTAMP, RECORD_FIELDS[TIMESTAMP][1]) != RECORD_FIELDS[TIMESTAMP][1]:
+                    timestamp = last_timestamp = values[TIMESTAMP]
+                if definition.global_number != RECORD:
+                    continue
+                point = _record_point(values, timestamp)
+                if point is not None:
+                    yield point
+            # skip the CRC of the file
+            pos = end + 2
+    except (IndexError, struct.error) as e:
+        if not partial:
+            raise TrackLoadError("Truncated FIT file.") from e
+
+
+def _time(timestamp: typing.Optional[int]) -> typing.Optional[datetime.datetime]:
+    if timestamp is None:
+        return None
+    return datetime.datetime.fromtimestamp(FIT_EPOCH + timestamp, tz=datetime.timezone.utc)
+
+
+def read_fit(file: typing.BinaryIO) -> StreamedGpx:
+    """Read the track points of a FIT activity file, the same way read_gpx reads GPX files.
+
+    All records are put into a single segment. The file is read into memory as a whole, as FIT files are
+    compact (a few bytes per record) compared to the points they decode into.
+
+    Raises:
+        TrackLoadError: The file is not a valid FIT file.
+    """
+    first_time: typing.Optional[int] = None
+    last_time: typing.Optional[int] = None
+    lats: typing.List[float] = []
+    lngs: typing.List[float] = []
+    eles: typing.List[float] = []
+    times: typing.List[float] = []
+    for timestamp, lat, lng, ele in _read_points(file.read()):
+        lats.append(lat)
+        lngs.append(lng)
+        eles.append(ele)
+        times.append(FIT_EPOCH + timestamp if timestamp is not None else np.nan)
+        if timestamp is not None:
+            last_time = timestamp
+            if first_time is None:
+                first_time = timestamp
+    segments = []
+    segment_times = []
+    length = 0.0
+    if lats:
+        segment = (
+            np.array(lats, dtype=np.float64),
+            np.array(lngs, dtype=np.float64),
+            np.array(eles, dtype=np.float64),
+        )
+        length = float(utils.distances_2d(segment[0], segment[1]).sum())
+        segments.append(segment)
+        segment_times.append(np.array(times, dtype=np.float64))
+    return StreamedGpx(segments, _time(first_time), _time(last_time), length, segment_times)
+
+
+def read_start_time(file: typing.BinaryIO) -> typing.Optional[datetime.datetime]:
+    """Read the time of the first track point with a time; reading and decoding stop at that point.
+
+    The file is read in growing chunks, each time decoding the beginning read so far, so only about the
+    beginning of the file up to the first time is read (and decoded a few times at most).
+
+    Raises:
+        TrackLoadError: The file is not a valid FIT file (up to the first time).
+    """
+    data = b""
+    size = START_CHUNK_SIZE
+    while True:
+        chunk = file.read(size - len(data))
+        data += chunk
+        complete = len(data) < size
+        for timestamp, _, _, _ in _read_points(data, partial=not complete):
+            if timestamp is not None:
+                return _time(timestamp)
+        if complete:
+            return None
+        size *= START_CHUNK_GROWTH
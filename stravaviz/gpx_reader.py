@@ -0,0 +1,128 @@
+import datetime
+import typing
+import xml.etree.ElementTree as ET
+
+import gpxpy.gpxfield  # type: ignore
+import numpy as np
+
+from stravaviz.exceptions import TrackLoadError
+from stravaviz import utils
+
+
+class StreamedGpx(typing.NamedTuple):
+    """Track points read from a GPX file by read_gpx.
+
+    Attributes:
+        segments: Latitudes, longitudes and elevations (NaN if missing) of each track segment.
+        start_time: Time of the first track point with a time.
+        end_time: Time of the last track point with a time.
+        length_2d: 2-dimensional length of the track in meters (computed the same way as gpxpy).
+        times: Times (POSIX seconds, NaN if missing) of the points of each track segment.
+    """
+
+    segments: typing.List[typing.Tuple[np.ndarray, np.ndarray, np.ndarray]]
+    start_time: typing.Optional[datetime.datetime]
+    end_time: typing.Optional[datetime.datetime]
+    length_2d: float
+    times: typing.List[np.ndarray]
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_times(texts: typing.List[typing.Optional[str]]) -> np.ndarray:
+    """Convert GPX times to POSIX seconds (NaN for None); UTC times ("...Z") are converted in bulk."""
+    if all(text is None or text.endswith("Z") for text in texts):
+        times = np.array([text[:-1] if text else "NaT" for text in texts], dtype="datetime64[ms]")
+        posix = times.astype(np.int64) / 1000
+        posix[np.isnat(times)] = np.nan
+        return posix
+    seconds = []
+    for text in texts:
+        time = gpxpy.gpxfield.parse_time(text) if text else None
+        seconds.append(time.timestamp() if time else np.nan)
+    return np.array(seconds, dtype=np.float64)
+
+
+def read_gpx(file: typing.BinaryIO) -> StreamedGpx:
+    """Read track points of a GPX file with an incremental XML parser.
+
+    Unlike gpxpy.parse, this never builds the whole document: each <trkpt> is turned into
+    numbers as soon as it is parsed and discarded afterwards. Everything except track points
+    (waypoints, routes, extensions, metadata) is ignored.
+
+    Raises:
+        TrackLoadError: A track point has no valid coordinates.
+        xml.etree.ElementTree.ParseError: The file is not valid XML.
+    """
+    segments = []
+    segment_times = []
+    first_time: typing.Optional[str] = None
+    last_time: typing.Optional[str] = None
+    length = 0.0
+    lats: typing.List[float] = []
+    lngs: typing.List[float] = []
+    eles: typing.List[float] = []
+    times: typing.List[typing.Optional[str]] = []
+    for _, elem in ET.iterparse(file, events=("end",)):
+        tag = _local_name(elem.tag)
+        if tag == "trkpt":
+            try:
+                lats.append(float(elem.attrib["lat"]))
+                lngs.append(float(elem.attrib["lon"]))
+            except (KeyError, ValueError) as e:
+                raise TrackLoadError("Track point without valid coordinates.") from e
+            ele = float("nan")
+            time = None
+            for child in elem:
+                child_tag = _local_name(child.tag)
+                if child_tag == "ele" and child.text and child.text.strip():
+                    ele = float(child.text)
+                elif child_tag == "time" and child.text and child.text.strip():
+                    time = last_time = child.text.strip()
+                    if first_time is None:
+                        first_time = last_time
+            eles.append(ele)
+            times.append(time)
+            elem.clear()
+        elif tag == "trkseg":
+            segment = (
+                np.array(lats, dtype=np.float64),
+                np.array(lngs, dtype=np.float64),
+                np.array(eles, dtype=np.float64),
+            )
+            length += float(utils.distances_2d(segment[0], segment[1]).sum())
+            segments.append(segment)
+            segment_times.append(parse_times(times))
+            lats, lngs, eles, times = [], [], [], []
+            elem.clear()
+        elif tag == "trk":
+            elem.clear()
+    return StreamedGpx(
+        segments,
+        gpxpy.gpxfield.parse_time(first_time) if first_time else None,
+        gpxpy.gpxfield.parse_time(last_time) if last_time else None,
+        length,
+        segment_times,
+    )
+
+
+def read_start_time(file: typing.BinaryIO) -> typing.Optional[datetime.datetime]:
+    """Read the time of the first track point with a time, i.e. the start time of the track.
+
+    Parsing stops at that point, so this only reads the beginning of the file.
+
+    Raises:
+        xml.etree.ElementTree.ParseError: The file is not valid XML (up to the first time).
+    """
+    in_trkpt = False
+    for event, elem in ET.iterparse(file, events=("start", "end")):
+        tag = _local_name(elem.tag)
+        if tag == "trkpt":
+            in_trkpt = event == "start"
+            if not in_trkpt:
+                elem.clear()
+        elif in_trkpt and event == "end" and tag == "time" and elem.text and elem.text.strip():
+            return gpxpy.gpxfield.parse_time(elem.text.strip())
+    return None
@@ -1,9 +1,9 @@
-import argparse
 import typing
 
-import svgwrite  # type: ignore
-
+from stravaviz.artifacts import SharedArtifacts
 from stravaviz.exceptions import DrawerError
+from stravaviz.options import RenderOptions
+from stravaviz.svg_writer import SvgWriter
 from stravaviz.track import Track
 from stravaviz.tracks_drawer import TracksDrawer
 from stravaviz.xy import XY
@@ -17,46 +17,25 @@ class GridDrawer(TracksDrawer):
         draw: For each track, draw it on the drawer.
     """
 
-    def __init__(self, tracks: typing.List[Track], args: argparse.Namespace) -> None:
-        super().__init__(tracks, args)
+    def __init__(
+        self,
+        tracks: typing.List[Track],
+        options: typing.Optional[RenderOptions] = None,
+        artifacts: typing.Optional[SharedArtifacts] = None,
+    ) -> None:
+        super().__init__(tracks, options, artifacts)
 
-    def draw(self, dr: svgwrite.Drawing, g: svgwrite.container.Group, size: XY, offset: XY) -> None:
+    def draw(self, svg: SvgWriter, size: XY, offset: XY) -> None:
         if self.tracks is None:
             raise DrawerError("No tracks to draw.")
-        cell_size, counts = utils.compute_grid(len(self.tracks), size)
-        if cell_size is None or counts is None:
-            raise DrawerError("Unable to compute grid.")
-        count_x, count_y = counts[0], counts[1]
-        spacing_x = 0 if count_x <= 1 else (size.x - cell_size * count_x) / (count_x - 1)
-        spacing_y = 0 if count_y <= 1 else (size.y - cell_size * count_y) / (count_y - 1)
-        offset.x += (size.x - count_x * cell_size - (count_x - 1) * spacing_x) / 2
-        offset.y += (size.y - count_y * cell_size - (count_y - 1) * spacing_y) / 2
-        year_groups: typing.Dict[int, svgwrite.container.Group] = {}
-        for (index, tr) in enumerate(self.tracks):
-            year = tr.start_time().year
-            if year not in year_groups:
-                g_year = dr.g(id=f"year{year}")
-                g.add(g_year)
-                year_groups[year] = g_year
-            else:
-                g_year = year_groups[year]
-            p = XY(index % count_x, index // count_x) * XY(cell_size + spacing_x, cell_size + spacing_y)
-            self._draw_track(
-                dr,
-                g_year,
-                tr,
-                0.9 * XY(cell_size, cell_size),
-                offset + 0.05 * XY(cell_size, cell_size) + p,
-            )
-
-    def _draw_track(self, dr: svgwrite.Drawing, g: svgwrite.container.Group, tr: Track, size: XY, offset: XY) -> None:
-        for line in utils.project(tr.bbox(), size, offset, tr.polylines):
-            polyline = dr.polyline(
-                points=line,
-                stroke="#000000",
-                fill="none",
-                stroke_width=0.5,
-                stroke_linejoin="round",
-                stroke_linecap="round",
-            )
-            g.add(polyline)
+        layout = self.artifacts.grid_layout(size)
+        for year, indices in self.artifacts.tracks_by_year.items():
+            with svg.group(id=f"year{year}"):
+                for index in indices:
+                    self._draw_track(svg, self.tracks[index], *layout.cell(index, offset))
+
+    @staticmethod
+    def _draw_track(svg: SvgWriter, tr: Track, size: XY, offset: XY) -> None:
+        bbox = tr.bbox()
+        lats, lngs, offsets = tr.level_of_detail(utils.max_deviation_meters(bbox, size))
+        svg.path(utils.project_segments(bbox, size, offset, lats, lngs, offsets))
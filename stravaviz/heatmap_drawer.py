@@ -1,16 +1,17 @@
-import argparse
 import logging
 import math
 import typing
 
-import svgwrite  # type: ignore
+import numpy as np
 import s2sphere  # type: ignore
 
-from stravaviz.exceptions import ParameterError
+from stravaviz.artifacts import SharedArtifacts
+from stravaviz.options import RenderOptions
+from stravaviz.svg_writer import SvgWriter
 from stravaviz.track import Track
 from stravaviz.tracks_drawer import TracksDrawer
 from stravaviz.xy import XY
-from stravaviz import utils
+from stravaviz import raster, spatial_index, utils
 
 log = logging.getLogger(__name__)
 
@@ -26,79 +27,106 @@ class HeatmapDrawer(TracksDrawer):
         Create_args: Create arguments for heatmap.
         fetch_args: Get arguments passed.
         draw: Draw the heatmap based on the Poster's tracks.
+        draw_raster: Rasterize the heatmap into a density raster.
+        region: Return the drawn region if it is fixed.
 
     """
-    def __init__(self, tracks: typing.List[Track], args: argparse.Namespace):
-        super().__init__(tracks, args)
+    def __init__(
+        self,
+        tracks: typing.List[Track],
+        options: typing.Optional[RenderOptions] = None,
+        artifacts: typing.Optional[SharedArtifacts] = None,
+    ):
+        super().__init__(tracks, options, artifacts)
         self._center = None
-        if args.heatmap_center:
-            latlng_str = args.heatmap_center.split(",")
-            if len(latlng_str) != 2:
-                raise ParameterError(f"Not a valid LAT,LNG pair: {args.heatmap_center}")
-            try:
-                lat = float(latlng_str[0].strip())
-                lng = float(latlng_str[1].strip())
-            except ValueError as e:
-                raise ParameterError(f"Not a valid LAT,LNG pair: {args.heatmap_center}") from e
-            if not -90 <= lat <= 90 or not -180 <= lng <= 180:
-                raise ParameterError(f"Not a valid LAT,LNG pair: {args.heatmap_center}")
-            self._center = s2sphere.LatLng.from_degrees(lat, lng)
-        if args.heatmap_radius:
-            if args.heatmap_radius <= 0:
-                raise ParameterError(f"Not a valid radius: {args.heatmap_radius} (must be > 0)")
-            if not args.heatmap_center:
-                raise ParameterError("--heatmap-radius needs --heatmap-center")
-            self._radius = args.heatmap_radius
+        self._radius = None
+        if self.options.heatmap_center is not None:
+            self._center = s2sphere.LatLng.from_degrees(*self.options.heatmap_center)
+        if self.options.heatmap_radius is not None:
+            self._radius = self.options.heatmap_radius
 
     def _determine_bbox(self) -> s2sphere.LatLngRect:
         if self._center:
             log.info("Forcing heatmap center to %s", str(self._center))
-            dlat, dlng = 0, 0
+            dlat, dlng = 0.0, 0.0
             if self._radius:
                 er = 6378.1
                 quarter = er * math.pi / 2
                 dlat = 90 * self._radius / quarter
                 scale = 1 / math.cos(self._center.lat().radians)
                 dlng = scale * 90 * self._radius / quarter
-            else:
-                for tr in self.tracks:
-                    for line in tr.polylines:
-                        for latlng in line:
-                            d = abs(self._center.lat().degrees - latlng.lat().degrees)
-                            dlat = max(dlat, d)
-                            d = abs(self._center.lng().degrees - latlng.lng().degrees)
-                            while d > 360:
-                                d -= 360
-                            if d > 180:
-                                d = 360 - d
-                            dlng = max(dlng, d)
+            elif self.tracks:
+                dlat, dlng = self._max_distances(self._center.lat().degrees, self._center.lng().degrees)
             return s2sphere.LatLngRect.from_center_size(self._center, s2sphere.LatLng.from_degrees(2 * dlat, 2 * dlng))
 
-        tracks_bbox = s2sphere.LatLngRect()
-        for tr in self.tracks:
-            tracks_bbox = tracks_bbox.union(tr.bbox())
-        return tracks_bbox
+        return self.artifacts.bbox()
 
-    def draw(self, dr: svgwrite.Drawing, g: svgwrite.container.Group, size: XY, offset: XY) -> None:
+    def region(self) -> typing.Optional[s2sphere.LatLngRect]:
+        """Return the drawn region if it doesn't depend on the tracks (center and radius given), else None."""
+        if self._center and self._radius:
+            return self._determine_bbox()
+        return None
+
+    def _max_distances(self, lat: float, lng: float) -> typing.Tuple[float, float]:
+        """Largest latitude and longitude distance (degrees) of the tracks from the given point.
+
+        Computed from the border boxes of the segments, whose corners are the extreme points.
+        """
+        boxes = np.concatenate([tr.segment_bboxes() for tr in self.tracks])
+        boxes = boxes[~np.isnan(boxes[:, 0])]
+        if len(boxes) == 0:
+            return 0.0, 0.0
+        dlat = float(np.abs(boxes[:, :2] - lat).max())
+        dlngs = np.abs(boxes[:, 2:] - lng) % 360
+        dlng = float(np.minimum(dlngs, 360 - dlngs).max())
+        # a segment spanning the meridian opposite the center reaches the largest possible distance
+        antipode = lng - 180 if lng > 0 else lng + 180
+        inverted = boxes[:, 2] > boxes[:, 3]
+        starts_before, ends_after = boxes[:, 2] <= antipode, boxes[:, 3] >= antipode
+        if np.where(inverted, starts_before | ends_after, starts_before & ends_after).any():
+            dlng = 180.0
+        return dlat, dlng
+
+    def _visible_tracks(
+        self, bbox: s2sphere.LatLngRect, size: XY
+    ) -> typing.Iterator[typing.Tuple[Track, np.ndarray, np.ndarray, np.ndarray]]:
+        """Yield tracks with lats, lngs and offsets of their segments that may be visible within bbox.
+
+        Tracks are yielded grouped by year (see SharedArtifacts.tracks_by_year). With a forced center, only
+        tracks and segments whose bounding boxes intersect bbox (looked up in a spatial index) are returned.
+        """
+        max_deviation = utils.max_deviation_meters(bbox, size)
+        visible: typing.Optional[typing.Dict[int, np.ndarray]] = None
+        if self._center:
+            visible = dict(self.artifacts.track_index().query(spatial_index.rect_from_latlngrect(bbox)))
+        for indices in self.artifacts.tracks_by_year.values():
+            for i in indices:
+                tr = self.tracks[i]
+                if visible is None:
+                    lats, lngs, offsets = tr.level_of_detail(max_deviation)
+                elif i in visible:
+                    lats, lngs, offsets = utils.select_segments(*tr.level_of_detail(max_deviation), visible[i])
+                else:
+                    continue
+                yield tr, lats, lngs, offsets
+
+    def draw_raster(self, density: raster.DensityRaster, size: XY, offset: XY) -> None:
+        """Rasterize all tracks into the density raster (size and offset in pixels)."""
+        bbox = self._determine_bbox()
+        for _, lats, lngs, offsets in self._visible_tracks(bbox, size):
+            for line in utils.project_segments(bbox, size, offset, lats, lngs, offsets):
+                density.add_line(line)
+
+    def draw(self, svg: SvgWriter, size: XY, offset: XY) -> None:
         """Draw the heatmap based on tracks."""
         bbox = self._determine_bbox()
-        year_groups: typing.Dict[int, svgwrite.container.Group] = {}
-        for tr in self.tracks:
-            year = tr.start_time().year
-            if year not in year_groups:
-                g_year = dr.g(id=f"year{year}")
-                g.add(g_year)
-                year_groups[year] = g_year
-            else:
-                g_year = year_groups[year]
-            for line in utils.project(bbox, size, offset, tr.polylines):
-                g_year.add(
-                        dr.polyline(
-                                points=line,
-                                stroke="#000000",
-                                fill="none",
-                                stroke_width=0.5,
-                                stroke_linejoin="round",
-                                stroke_linecap="round",
-                        )
-                )
+        year = None
+        for tr, lats, lngs, offsets in self._visible_tracks(bbox, size):
+            if tr.start_time().year != year:
+                if year is not None:
+                    svg.close_group()
+                year = tr.start_time().year
+                svg.open_group(id=f"year{year}")
+            svg.path(utils.project_segments(bbox, size, offset, lats, lngs, offsets))
+        if year is not None:
+            svg.close_group()
@@ -0,0 +1,99 @@
+import math
+import typing
+
+from stravaviz import defaults
+from stravaviz.exceptions import ParameterError
+
+# Formats the heatmap can be drawn in, and color ramps of the PNG heatmap.
+HEATMAP_FORMATS = ("svg", "png")
+HEATMAP_SCALES = ("log", "equalize")
+
+
+class RenderOptions(typing.NamedTuple):
+    """Options of the rendered images, independent of the command line.
+
+    Options are immutable (and hashable), so they can be shared by threads and used as keys of caches.
+
+    Attributes:
+        width: Image width (mm).
+        height: Image height (mm).
+        background_color: Background color.
+        track_color: Color of the tracks.
+        precision: Number of decimal places of coordinates in SVG images (all if None).
+        merge_paths: Write all tracks of a year as a single path in SVG images.
+        elevation_axis: Draw elevation profiles over "distance", "time" or "index" (see defaults.ELEVATION_AXES).
+        heatmap_center: Latitude and longitude of the center of the heatmap (automatic if None).
+        heatmap_radius: Scale the heatmap such that a circle with this radius (km) around the center is visible.
+        heatmap_format: Draw the heatmap as vector tracks ("svg") or as rasterized density map ("png").
+        heatmap_pixels: Width and height of the PNG heatmap in pixels.
+        heatmap_scale: Color ramp of the PNG heatmap; logarithmic ("log") or histogram-equalized ("equalize").
+
+    Methods:
+        validate: Check the options.
+    """
+
+    width: float = 300
+    height: float = 300
+    background_color: str = "#FFFFFF"
+    track_color: str = "#000000"
+    precision: typing.Optional[int] = defaults.PRECISION
+    merge_paths: bool = False
+    elevation_axis: str = "distance"
+    heatmap_center: typing.Optional[typing.Tuple[float, float]] = None
+    heatmap_radius: typing.Optional[float] = None
+    heatmap_format: str = "svg"
+    heatmap_pixels: int = 3000
+    heatmap_scale: str = "log"
+
+    def validate(self) -> None:
+        """Check the options.
+
+        Raises:
+            ParameterError: An option has an invalid value.
+        """
+        if not math.isfinite(self.width) or not math.isfinite(self.height) or self.width <= 0 or self.height <= 0:
+            raise ParameterError(f"Not a valid size: {self.width}x{self.height} (must be > 0)")
+        if self.precision is not None and self.precision < 0:
+            raise ParameterError(f"Not a valid precision: {self.precision} (must be >= 0)")
+        if self.elevation_axis not in defaults.ELEVATION_AXES:
+            raise ParameterError(
+                f"Not a valid elevation axis: {self.elevation_axis} (choose from {','.join(defaults.ELEVATION_AXES)})"
+            )
+        if self.heatmap_center is not None:
+            lat, lng = self.heatmap_center
+            # NaN fails the range checks, too
+            if not -90 <= lat <= 90 or not -180 <= lng <= 180:
+                raise ParameterError(f"Not a valid LAT,LNG pair: {lat},{lng}")
+        if self.heatmap_radius is not None:
+            if not math.isfinite(self.heatmap_radius) or self.heatmap_radius <= 0:
+                raise ParameterError(f"Not a valid radius: {self.heatmap_radius} (must be > 0)")
+            if self.heatmap_center is None:
+                raise ParameterError("A heatmap radius needs a heatmap center.")
+        if self.heatmap_format not in HEATMAP_FORMATS:
+            raise ParameterError(
+                f"Not a valid heatmap format: {self.heatmap_format} (choose from {','.join(HEATMAP_FORMATS)})"
+            )
+        if self.heatmap_pixels <= 0:
+            raise ParameterError(f"Not a valid size: {self.heatmap_pixels} (must be > 0)")
+        if self.heatmap_scale not in HEATMAP_SCALES:
+            raise ParameterError(
+                f"Not a valid heatmap scale: {self.heatmap_scale} (choose from {','.join(HEATMAP_SCALES)})"
+            )
+
+
+def parse_lat_lng(s: str) -> typing.Tuple[float, float]:
+    """Parse "LAT,LNG" into a pair of floats.
+
+    Raises:
+        ParameterError: The string is not a valid pair of latitude and longitude.
+    """
+    parts = s.split(",")
+    if len(parts) != 2:
+        raise ParameterError(f"Not a valid LAT,LNG pair: {s}")
+    try:
+        lat, lng = float(parts[0].strip()), float(parts[1].strip())
+    except ValueError as e:
+        raise ParameterError(f"Not a valid LAT,LNG pair: {s}") from e
+    if not -90 <= lat <= 90 or not -180 <= lng <= 180:
+        raise ParameterError(f"Not a valid LAT,LNG pair: {s}")
+    return lat, lng
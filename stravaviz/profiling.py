@@ -0,0 +1,156 @@
+import contextlib
+import os
+import sys
+import threading
+import time
+import typing
+
+# Number of slowest files listed in the summary.
+SLOWEST_FILES = 10
+
+
+class Profiler:
+    """Collect wall and CPU time of stages, parse time of each file, and counts (points, elements, ...).
+
+    Stages may run several times (e.g. once per track) and concurrently in several threads; their times add
+    up. CPU time is the time of the thread running the stage plus that of child processes that finished
+    during the stage (e.g. a pool of worker processes).
+
+    Attributes:
+        stages: Calls, wall and CPU seconds by stage name, in the order the stages were first entered.
+        file_seconds: Parse time by file name.
+        counts: Counts by name.
+
+    Methods:
+        stage: Context manager that times a stage.
+        add_stages: Add the times of stages that ran elsewhere (e.g. in a worker process).
+        add_file: Record the parse time of a file.
+        count: Add to a count.
+        summary: Return a report for humans.
+        to_json: Return all data as JSON compatible dict.
+    """
+
+    def __init__(self) -> None:
+        self.stages: typing.Dict[str, typing.Dict[str, float]] = {}
+        self.file_seconds: typing.Dict[str, float] = {}
+        self.counts: typing.Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> typing.Iterator[None]:
+        wall, cpu, children = time.perf_counter(), time.thread_time(), _children_cpu()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.thread_time() - cpu + _children_cpu() - children
+            with self._lock:
+                stats = self.stages.setdefault(name, {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0})
+                stats["calls"] += 1
+                stats["wall_seconds"] += wall
+                stats["cpu_seconds"] += cpu
+
+    def add_stages(self, stages: typing.Dict[str, typing.Dict[str, float]]) -> None:
+        with self._lock:
+            for name, other in stages.items():
+                stats = self.stages.setdefault(name, {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0})
+                for key, value in other.items():
+                    stats[key] += value
+
+    def add_file(self, file_name: str, seconds: float) -> None:
+        with self._lock:
+            self.file_seconds[file_name] = seconds
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def summary(self) -> str:
+        lines = [f"{'Stage':<24}{'Calls':>8}{'Wall (s)':>12}{'CPU (s)':>12}"]
+        for name, stats in self.stages.items():
+            lines.append(f"{name:<24}{stats['calls']:>8}{stats['wall_seconds']:>12.3f}{stats['cpu_seconds']:>12.3f}")
+        if self.file_seconds:
+            slowest = sorted(self.file_seconds.items(), key=lambda item: item[1], reverse=True)[:SLOWEST_FILES]
+            lines.append("")
+            lines.append(f"Slowest of {len(self.file_seconds)} parsed files:")
+            lines.extend(f"{seconds:>10.3f}s  {os.path.basename(file_name)}" for file_name, seconds in slowest)
+        if self.counts:
+            lines.append("")
+            lines.append("Counts:")
+            lines.extend(f"  {name:<30}{value:>12}" for name, value in self.counts.items())
+        rss = peak_rss_mb()
+        if rss is not None:
+            lines.append("")
+            lines.append(f"Peak memory: {rss[0]:.1f} MB (largest worker process: {rss[1]:.1f} MB)")
+        return "\n".join(lines)
+
+    def to_json(self) -> typing.Dict[str, typing.Any]:
+        return {
+            "stages": self.stages,
+            "files": dict(sorted(self.file_seconds.items(), key=lambda item: item[1], reverse=True)),
+            "counts": self.counts,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+
+def peak_rss_mb() -> typing.Optional[typing.Tuple[float, float]]:
+    """Peak resident memory (MB) of this process and of its largest finished child process, if known."""
+    try:
+        import resource  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        # not available on Windows
+        return None
+    # kilobytes on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+    )
+
+
+def _children_cpu() -> float:
+    t = os.times()
+    return t.children_user + t.children_system
+
+
+_profiler: typing.Optional[Profiler] = None
+# process that enabled profiling; forked worker processes inherit the profiler, but must not use it
+_profiler_pid = 0
+_disabled = contextlib.nullcontext()
+
+
+def enable() -> Profiler:
+    """Start collecting; until then (and in worker processes) the functions below do nothing.
+
+    A worker process can enable its own profiler, e.g. for a batch of work, and send its stages back to the
+    process that started it (see add_stages).
+    """
+    global _profiler, _profiler_pid  # pylint: disable=global-statement
+    _profiler, _profiler_pid = Profiler(), os.getpid()
+    return _profiler
+
+
+def enabled() -> bool:
+    return _profiler is not None and _profiler_pid == os.getpid()
+
+
+def stage(name: str) -> typing.ContextManager[None]:
+    """Return a context manager that times a stage if profiling is enabled (see Profiler.stage)."""
+    if _profiler is None or _profiler_pid != os.getpid():
+        return _disabled
+    return _profiler.stage(name)
+
+
+def add_stages(stages: typing.Dict[str, typing.Dict[str, float]]) -> None:
+    if _profiler is not None and _profiler_pid == os.getpid():
+        _profiler.add_stages(stages)
+
+
+def add_file(file_name: str, seconds: float) -> None:
+    if _profiler is not None and _profiler_pid == os.getpid():
+        _profiler.add_file(file_name, seconds)
+
+
+def count(name: str, value: int = 1) -> None:
+    if _profiler is not None and _profiler_pid == os.getpid():
+        _profiler.count(name, value)
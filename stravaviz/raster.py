@@ -0,0 +1,159 @@
+import struct
+import typing
+import zlib
+
+import colour  # type: ignore
+import numpy as np
+
+# distance (in pixels) between two samples splatted along a line
+SAMPLE_SPACING = 0.5
+
+
+class DensityRaster:
+    """Accumulate the density of lines in a fixed size buffer.
+
+    Every line is sampled at sub-pixel steps and each sample is splatted into the four nearest pixels
+    (bilinear weights), which gives anti-aliased lines whose accumulated value is their length in pixels.
+    Splats are buffered and added to the image in batches about as large as the image itself, so memory
+    only depends on the size of the image (and of the longest line being added).
+
+    Attributes:
+        width: Width of the raster in pixels.
+        height: Height of the raster in pixels.
+        counts: Accumulated density, counts[y, x].
+
+    Methods:
+        add_line: Rasterize a line given in pixel coordinates.
+        colorize: Map the accumulated density to RGB colors.
+        colorize_alpha: Map the accumulated density to the opacity of a single color.
+    """
+
+    def __init__(self, width: int, height: int) -> None:
+        self.width = width
+        self.height = height
+        self._counts = np.zeros((height, width), dtype=np.float32)
+        self._pending_indices: typing.List[np.ndarray] = []
+        self._pending_values: typing.List[np.ndarray] = []
+        self._pending_count = 0
+
+    @property
+    def counts(self) -> np.ndarray:
+        self._flush()
+        return self._counts
+
+    def add_line(self, points: np.ndarray) -> None:
+        """Rasterize a line given as (n, 2) array of x, y pixel coordinates."""
+        if len(points) == 0:
+            return
+        if len(points) == 1:
+            self._splat(points[:, 0], points[:, 1], np.ones(1))
+            return
+        starts = points[:-1]
+        deltas = points[1:] - starts
+        lengths = np.hypot(deltas[:, 0], deltas[:, 1])
+        steps = np.maximum(np.ceil(lengths / SAMPLE_SPACING), 1).astype(np.int64)
+        # sample j of a segment lies at starts + deltas * j / steps, for j in 0..steps-1
+        segment = np.repeat(np.arange(len(steps)), steps)
+        first_sample = np.cumsum(steps) - steps
+        t = (np.arange(len(segment)) - first_sample[segment]) / steps[segment]
+        xs = starts[segment, 0] + deltas[segment, 0] * t
+        ys = starts[segment, 1] + deltas[segment, 1] * t
+        self._splat(xs, ys, (lengths / steps)[segment])
+
+    def _splat(self, xs: np.ndarray, ys: np.ndarray, weights: np.ndarray) -> None:
+        # pixel (i, j) covers [i, i + 1) x [j, j + 1), its center is at (i + 0.5, j + 0.5)
+        fx = xs - 0.5
+        fy = ys - 0.5
+        ix = np.floor(fx).astype(np.int64)
+        iy = np.floor(fy).astype(np.int64)
+        wx = fx - ix
+        wy = fy - iy
+        for dx, dy, w in (
+            (0, 0, (1 - wx) * (1 - wy)),
+            (1, 0, wx * (1 - wy)),
+            (0, 1, (1 - wx) * wy),
+            (1, 1, wx * wy),
+        ):
+            px = ix + dx
+            py = iy + dy
+            inside = (px >= 0) & (px < self.width) & (py >= 0) & (py < self.height)
+            self._pending_indices.append(py[inside] * self.width + px[inside])
+            self._pending_values.append((weights * w)[inside])
+            self._pending_count += len(self._pending_indices[-1])
+        if self._pending_count >= self.width * self.height:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._pending_indices:
+            return
+        flat = self._counts.reshape(-1)
+        flat += np.bincount(
+            np.concatenate(self._pending_indices),
+            weights=np.concatenate(self._pending_values),
+            minlength=self.width * self.height,
+        ).astype(np.float32)
+        self._pending_indices = []
+        self._pending_values = []
+        self._pending_count = 0
+
+    def colorize(self, background: str, foreground: str, scale: str = "log") -> np.ndarray:
+        """Map the accumulated density to an (height, width, 3) uint8 RGB image.
+
+        Args:
+            background: Color of pixels without any line.
+            foreground: Color of the densest pixels.
+            scale: "log" for a logarithmic ramp, "equalize" for a histogram-equalized ramp.
+        """
+        levels = normalize(self.counts, scale)
+        ramp = np.array(
+            [c.rgb for c in colour.Color(background).range_to(colour.Color(foreground), 256)], dtype=np.float64
+        )
+        lut = np.round(ramp * 255).astype(np.uint8)
+        return lut[np.round(levels * 255).astype(np.int64)]
+
+    def colorize_alpha(self, foreground: str, reference: float) -> np.ndarray:
+        """Map the accumulated density to an (height, width, 4) uint8 RGBA image of a single color.
+
+        The opacity follows a logarithmic ramp that reaches 1 at the reference density.
+        """
+        rgba = np.empty((self.height, self.width, 4), dtype=np.uint8)
+        rgba[:, :, :3] = np.round(np.array(colour.Color(foreground).rgb) * 255).astype(np.uint8)
+        rgba[:, :, 3] = np.round(normalize(self.counts, "log", reference) * 255).astype(np.uint8)
+        return rgba
+
+
+def normalize(counts: np.ndarray, scale: str, reference: typing.Optional[float] = None) -> np.ndarray:
+    """Map densities to [0, 1], with 0 reserved for pixels without any line.
+
+    The log scale maps the reference density (the maximum if None) to 1, so several images rendered
+    with the same reference (e.g. map tiles) use the same ramp.
+    """
+    levels = np.zeros(counts.shape, dtype=np.float64)
+    nonzero = counts > 0
+    if not nonzero.any():
+        return levels
+    if scale == "equalize":
+        values = counts[nonzero]
+        ranks = np.searchsorted(np.sort(values), values, side="right")
+        levels[nonzero] = ranks / len(values)
+    else:
+        top = counts.max() if reference is None else reference
+        levels[nonzero] = np.minimum(np.log1p(counts[nonzero]) / np.log1p(top), 1)
+    return levels
+
+
+def write_png(file: typing.BinaryIO, rgb: np.ndarray) -> None:
+    """Write an (height, width, 3) or (height, width, 4) uint8 image as an 8-bit RGB or RGBA PNG."""
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    height, width, channels = rgb.shape
+    # every scanline starts with filter type 0 (none)
+    scanlines = np.zeros((height, width * channels + 1), dtype=np.uint8)
+    scanlines[:, 1:] = rgb.reshape(height, width * channels)
+    color_type = 6 if channels == 4 else 2
+    file.write(b"\x89PNG\r\n\x1a\n")
+    file.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)))
+    file.write(chunk(b"IDAT", zlib.compress(scanlines.tobytes(), 6)))
+    file.write(chunk(b"IEND", b""))
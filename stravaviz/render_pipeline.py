@@ -0,0 +1,116 @@
+import concurrent.futures
+import functools
+import logging
+import os
+import typing
+
+from stravaviz import defaults, profiling, tiles
+from stravaviz.artifacts import SharedArtifacts
+from stravaviz.drawer import Drawer
+from stravaviz.elevations_drawer import ElevationsDrawer
+from stravaviz.exceptions import ParameterError
+from stravaviz.grid_drawer import GridDrawer
+from stravaviz.heatmap_drawer import HeatmapDrawer
+from stravaviz.options import RenderOptions
+from stravaviz.tracks_drawer import TracksDrawer
+
+log = logging.getLogger(__name__)
+
+OUTPUTS = defaults.OUTPUTS
+# Drawer of each output.
+DRAWERS: typing.Dict[str, typing.Type[TracksDrawer]] = {
+    "facets": GridDrawer,
+    "elevations": ElevationsDrawer,
+    "heatmap": HeatmapDrawer,
+}
+
+
+def parse_outputs(s: str) -> typing.List[str]:
+    """Parse a comma separated list of output names (see OUTPUTS).
+
+    Raises:
+        ParameterError: The list is empty or contains an unknown output.
+    """
+    names = {name.strip() for name in s.split(",") if name.strip()}
+    if not names or not names.issubset(OUTPUTS):
+        raise ParameterError(f"Not a valid list of outputs: {s} (choose from {','.join(OUTPUTS)})")
+    return [name for name in OUTPUTS if name in names]
+
+
+class RenderPipeline:
+    """Render several outputs from one set of tracks.
+
+    Data several outputs need (year grouping, grid layout, elevation range, border boxes) is computed once
+    up front. The outputs don't depend on each other, so they are then rendered concurrently on a pool of
+    worker threads, which share the tracks without copying them.
+
+    Attributes:
+        drawer: Drawer with the tracks and the image settings.
+        options: Options of the images.
+        outputs: Names of the outputs to render (see OUTPUTS).
+        tile_zooms: Range of zoom levels of map tiles to render, if any.
+        artifacts: Data derived from the tracks, shared by all outputs.
+
+    Methods:
+        render: Render all outputs (and map tiles if requested) into a directory.
+    """
+
+    def __init__(
+        self,
+        drawer: Drawer,
+        options: RenderOptions,
+        outputs: typing.List[str],
+        tile_zooms: typing.Optional[typing.Tuple[int, int]] = None,
+    ) -> None:
+        self.drawer = drawer
+        self.options = options
+        self.outputs = outputs
+        self.tile_zooms = tile_zooms
+        with profiling.stage("layout"):
+            self.artifacts = SharedArtifacts(drawer.tracks)
+            if "facets" in outputs or "elevations" in outputs:
+                self.artifacts.grid_layout(drawer.content_size())
+
+    def render(self, output_dir: str) -> typing.Dict[str, typing.Any]:
+        """Render all outputs into output_dir.
+
+        All drawers are set up (and their options validated) before anything is rendered.
+
+        Returns:
+            Result of each job: the name of the written file for images, the number of rendered tiles for "tiles".
+        """
+        jobs = self._jobs(output_dir)
+        results = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(len(jobs), 1)) as executor:
+            futures = {name: executor.submit(self._run, name, job) for name, job in jobs.items()}
+            for name, future in futures.items():
+                results[name] = future.result()
+                log.info("Rendered %s", name)
+        return results
+
+    def _jobs(self, output_dir: str) -> typing.Dict[str, typing.Callable[[], typing.Any]]:
+        d = self.drawer
+        jobs: typing.Dict[str, typing.Callable[[], typing.Any]] = {}
+        for name in self.outputs:
+            tracks_drawer = DRAWERS[name](d.tracks, self.options, self.artifacts)
+            if isinstance(tracks_drawer, HeatmapDrawer) and self.options.heatmap_format == "png":
+                jobs[name] = functools.partial(self._draw_png, tracks_drawer, os.path.join(output_dir, f"{name}.png"))
+            else:
+                jobs[name] = functools.partial(self._draw, tracks_drawer, os.path.join(output_dir, f"{name}.svg"))
+        if self.tile_zooms:
+            renderer = tiles.TileRenderer(d.tracks, self.tile_zooms, d.colors["track"])
+            jobs["tiles"] = functools.partial(renderer.render, os.path.join(output_dir, "tiles"))
+        return jobs
+
+    @staticmethod
+    def _run(name: str, job: typing.Callable[[], typing.Any]) -> typing.Any:
+        with profiling.stage(f"render {name}"):
+            return job()
+
+    def _draw(self, tracks_drawer: TracksDrawer, output: str) -> str:
+        self.drawer.draw(tracks_drawer, output)
+        return output
+
+    def _draw_png(self, heatmap: HeatmapDrawer, output: str) -> str:
+        self.drawer.draw_png(heatmap, output, self.options.heatmap_pixels, self.options.heatmap_scale)
+        return output
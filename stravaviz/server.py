@@ -0,0 +1,297 @@
+import collections
+import http.server
+import json
+import logging
+import math
+import os
+import socketserver
+import threading
+import time
+import typing
+import urllib.parse
+
+from stravaviz import api, defaults, options
+from stravaviz.artifacts import SharedArtifacts
+from stravaviz.exceptions import DrawerError, ParameterError
+from stravaviz.track import Track
+from stravaviz.track_loader import TrackSet
+from stravaviz.year_range import YearRange
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = defaults.SERVE_CACHE_SIZE
+DEFAULT_PORT = defaults.SERVE_PORT
+
+
+def _float(s: str) -> float:
+    value = float(s)
+    if not math.isfinite(value):
+        raise ValueError(f"not a finite number: {s}")
+    return value
+
+
+def _size(s: str) -> float:
+    # whole numbers are kept as int, so they are written into images the same way as the default size
+    value = _float(s)
+    return int(value) if value.is_integer() else value
+
+
+# Query parameters of render requests, with their conversion; all but "year" override a field of RenderOptions.
+PARAMETERS: typing.Dict[str, typing.Callable[[str], typing.Any]] = {
+    "year": str,
+    "width": _size,
+    "height": _size,
+    "background_color": str,
+    "track_color": str,
+    "precision": int,
+    "elevation_axis": str,
+    "heatmap_center": options.parse_lat_lng,
+    "heatmap_radius": _float,
+    "heatmap_format": str,
+    "heatmap_pixels": int,
+    "heatmap_scale": str,
+}
+
+# Largest values of query parameters, so a single request can't take unbounded memory or time (a PNG heatmap
+# has heatmap_pixels^2 pixels, each taking several bytes while it is drawn).
+MAX_VALUES: typing.Dict[str, float] = {"width": 10000, "height": 10000, "precision": 10, "heatmap_pixels": 8192}
+
+YearKey = typing.Tuple[typing.Optional[int], typing.Optional[int]]
+CacheKey = typing.Tuple[str, str, YearKey, options.RenderOptions]
+
+
+class ResultCache:
+    """Rendered images by key, dropping the least recently used ones beyond a number of entries.
+
+    Attributes:
+        max_entries: Largest number of images kept.
+        hits: Number of lookups that found an image.
+        misses: Number of lookups that didn't.
+
+    Methods:
+        get: Return the image for a key, if cached.
+        put: Store the image for a key.
+        clear: Drop all images.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE) -> None:
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "collections.OrderedDict[CacheKey, typing.Tuple[str, bytes]]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: CacheKey) -> typing.Optional[typing.Tuple[str, bytes]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: CacheKey, entry: typing.Tuple[str, bytes]) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class RenderServer:
+    """Render images on request from tracks kept in memory, answering repeated requests from a cache.
+
+    The activity files are checked for changes at most every interval seconds, when a request comes in. Changed
+    files are loaded while other requests are still answered from the previous tracks; then the cached images
+    are dropped. Images are cached by the version of the tracks (see TrackSet), the output and the normalized
+    parameters, so requests that differ only in the spelling of their parameters share an image.
+
+    Attributes:
+        track_set: Tracks to render.
+        options: Options of the images that requests don't override.
+        year: Year range of requests that don't give one (see YearRange.parse).
+        interval: Least time (seconds) between two checks of the activity files.
+        cache: Rendered images.
+
+    Methods:
+        update: Check the activity files for changes now.
+        render: Render an output for the parameters of a request.
+        status: Return the state of the tracks and the cache.
+    """
+
+    def __init__(
+        self,
+        track_set: TrackSet,
+        render_options: typing.Optional[options.RenderOptions] = None,
+        year: str = "all",
+        interval: float = defaults.WATCH_INTERVAL,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+    ) -> None:
+        self.track_set = track_set
+        self.options = render_options if render_options is not None else options.RenderOptions()
+        self.options.validate()
+        self.year = year
+        self.interval = interval
+        self.cache = ResultCache(cache_size)
+        # version, tracks and their artifacts (by year range) are replaced together, so a request never mixes them up
+        self._snapshot: typing.Tuple[str, typing.List[Track], typing.Dict[YearKey, SharedArtifacts]] = ("", [], {})
+        self._artifacts_lock = threading.Lock()
+        self._checked = 0.0
+        self._update_lock = threading.Lock()
+
+    def update(self) -> None:
+        """Check the activity files for changes and load them; nothing happens if another update is running."""
+        if not self._update_lock.acquire(blocking=False):  # pylint: disable=consider-using-with
+            return
+        try:
+            self._checked = time.monotonic()
+            if self.track_set.update():
+                self._snapshot = (self.track_set.version, self.track_set.tracks, {})
+                self.cache.clear()
+                log.info("Serving %d tracks (version %s)", len(self.track_set.tracks), self.track_set.version)
+        finally:
+            self._update_lock.release()
+
+    def render(self, output: str, query: typing.Mapping[str, str]) -> typing.Tuple[str, bytes]:
+        """Render an output for the parameters of a request (see PARAMETERS).
+
+        Returns:
+            Media type and contents of the image.
+
+        Raises:
+            ParameterError: The output or a parameter is not valid, or no tracks are in the year range.
+        """
+        if time.monotonic() - self._checked >= self.interval:
+            self.update()
+        years, render_options = self._parse(query)
+        version, tracks, artifacts = self._snapshot
+        year_key = (years.from_year, years.to_year)
+        key = (version, output, year_key, render_options)
+        entry = self.cache.get(key)
+        if entry is not None:
+            return entry
+        with self._artifacts_lock:
+            if year_key not in artifacts:
+                selected = [t for t in tracks if years.contains(t.start_time())]
+                if not selected:
+                    raise ParameterError("No tracks in the year range.")
+                artifacts[year_key] = SharedArtifacts(selected)
+            shared = artifacts[year_key]
+        data = api.render_bytes(shared.tracks, output, render_options, shared)
+        entry = (api.media_type(output, render_options), data)
+        self.cache.put(key, entry)
+        return entry
+
+    def status(self) -> typing.Dict[str, typing.Any]:
+        if time.monotonic() - self._checked >= self.interval:
+            self.update()
+        version, tracks, _ = self._snapshot
+        return {
+            "version": version,
+            "tracks": len(tracks),
+            "cached": len(self.cache),
+            "hits": self.cache.hits,
+            "misses": self.cache.misses,
+        }
+
+    def _parse(self, query: typing.Mapping[str, str]) -> typing.Tuple[YearRange, options.RenderOptions]:
+        values = {}
+        for name, value in query.items():
+            if name not in PARAMETERS:
+                raise ParameterError(f"Unknown parameter: {name} (choose from {','.join(PARAMETERS)})")
+            try:
+                values[name] = PARAMETERS[name](value)
+            except ValueError as e:
+                raise ParameterError(f"Not a valid {name}: {value}") from e
+            if name in MAX_VALUES and values[name] > MAX_VALUES[name]:
+                raise ParameterError(f"Not a valid {name}: {value} (must be <= {MAX_VALUES[name]})")
+        years = YearRange()
+        year = values.pop("year", self.year)
+        if not years.parse(year):
+            raise ParameterError(f"Bad year range: {year}.")
+        render_options = self.options._replace(**values)
+        render_options.validate()
+        return years, render_options
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    """Answer GET /render/OUTPUT?PARAMETERS with an image and GET /status with the status as JSON."""
+
+    server: "typing.Union[_HTTPServer, _UnixHTTPServer]"
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        url = urllib.parse.urlsplit(self.path)
+        render_server = self.server.render_server
+        try:
+            if url.path == "/status":
+                self._respond(200, "application/json", json.dumps(render_server.status()).encode("utf-8"))
+            elif url.path.startswith("/render/"):
+                query = dict(urllib.parse.parse_qsl(url.query, keep_blank_values=True))
+                media_type, data = render_server.render(url.path[len("/render/") :], query)
+                self._respond(200, media_type, data)
+            else:
+                self._respond(404, "text/plain", b"Not found.\n")
+        except ParameterError as e:
+            self._respond(400, "text/plain", f"{e}\n".encode("utf-8"))
+        except DrawerError as e:
+            log.error("Failed to render %s: %s", self.path, str(e))
+            self._respond(500, "text/plain", f"{e}\n".encode("utf-8"))
+        except Exception:
+            log.exception("Failed to answer %s", self.path)
+            self._respond(500, "text/plain", b"Internal error.\n")
+
+    def _respond(self, status: int, media_type: str, data: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", media_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self) -> str:
+        # clients of unix sockets have no address
+        return str(self.client_address[0]) if isinstance(self.client_address, tuple) else "local"
+
+    def log_message(self, format: str, *args: typing.Any) -> None:  # pylint: disable=redefined-builtin
+        log.info("%s %s", self.address_string(), format % args)
+
+
+class _HTTPServer(http.server.ThreadingHTTPServer):
+    render_server: RenderServer
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    render_server: RenderServer
+
+
+def serve(
+    render_server: RenderServer,
+    host: str = "127.0.0.1",
+    port: int = DEFAULT_PORT,
+    socket_path: typing.Optional[str] = None,
+) -> None:
+    """Load the tracks, then answer requests (on a unix socket if socket_path is given) until interrupted."""
+    render_server.update()
+    server: typing.Union[_HTTPServer, _UnixHTTPServer]
+    if socket_path is not None:
+        server = _UnixHTTPServer(socket_path, _RequestHandler)
+        address = socket_path
+    else:
+        server = _HTTPServer((host, port), _RequestHandler)
+        address = f"http://{host}:{server.server_address[1]}/"
+    server.render_server = render_server
+    try:
+        with server:
+            print(f"Serving {render_server.status()['tracks']} tracks on {address} (press Ctrl+C to stop)...")
+            server.serve_forever()
+    finally:
+        if socket_path is not None:
+            os.unlink(socket_path)
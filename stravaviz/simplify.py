@@ -0,0 +1,93 @@
+import math
+import typing
+
+import numpy as np
+
+from stravaviz import utils
+
+
+def simplify(xs: np.ndarray, ys: np.ndarray, tolerance: float) -> np.ndarray:
+    """Ramer-Douglas-Peucker simplification of a single line.
+
+    Args:
+        xs, ys: Projected coordinates of the line (same unit as tolerance).
+        tolerance: Largest allowed distance of a dropped point from the simplified line.
+
+    Returns:
+        Sorted indices of the points to keep; the first and the last point are always kept.
+    """
+    n = len(xs)
+    if n < 3:
+        return np.arange(n, dtype=np.int64)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    tolerance2 = tolerance * tolerance
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        x0, y0 = xs[start], ys[start]
+        dx, dy = xs[end] - x0, ys[end] - y0
+        px, py = xs[start + 1 : end] - x0, ys[start + 1 : end] - y0
+        length2 = dx * dx + dy * dy
+        if length2 > 0:
+            # distance from the segment (not the infinite line), so that loops starting and ending at
+            # the same place are handled like any other line
+            t = np.clip((px * dx + py * dy) / length2, 0, 1)
+            px = px - t * dx
+            py = py - t * dy
+        distances2 = px * px + py * py
+        i = int(np.argmax(distances2))
+        if distances2[i] > tolerance2:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return np.flatnonzero(keep)
+
+
+def simplify_segments(lats: np.ndarray, lngs: np.ndarray, offsets: np.ndarray, tolerance: float) -> np.ndarray:
+    """Simplify each segment of a track (see Track for the layout) with a tolerance in meters.
+
+    The points are projected to a local equirectangular plane in meters before simplification.
+
+    Returns:
+        Sorted indices of the points to keep, the first and the last point of each segment are always kept.
+    """
+    kept = []
+    for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+        if end - start < 3:
+            kept.append(np.arange(start, end, dtype=np.int64))
+            continue
+        seg_lats = lats[start:end]
+        seg_lngs = np.degrees(np.unwrap(np.radians(lngs[start:end])))
+        coef = math.cos(math.radians(float(seg_lats.mean())))
+        kept.append(start + simplify(seg_lngs * coef * utils.ONE_DEGREE, seg_lats * utils.ONE_DEGREE, tolerance))
+    if not kept:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate(kept)
+
+
+def subset_offsets(kept: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Segment offsets of the points selected by kept (which must keep the first point of each segment)."""
+    return np.searchsorted(kept, offsets).astype(np.int64)
+
+
+def levels_of_detail(
+    lats: np.ndarray, lngs: np.ndarray, offsets: np.ndarray, tolerances: typing.Iterable[float]
+) -> typing.List[typing.Tuple[float, np.ndarray]]:
+    """Simplify already simplified segments further, once per (increasing) tolerance.
+
+    Every level is computed from the previous one, so each level is a subset of the finer ones.
+
+    Returns:
+        List of (tolerance, indices of the kept points) pairs.
+    """
+    levels = []
+    kept = np.arange(len(lats), dtype=np.int64)
+    for tolerance in tolerances:
+        level_offsets = subset_offsets(kept, offsets)
+        kept = kept[simplify_segments(lats[kept], lngs[kept], level_offsets, tolerance)]
+        levels.append((tolerance, kept))
+    return levels
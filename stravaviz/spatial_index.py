@@ -0,0 +1,179 @@
+import math
+import typing
+
+import numpy as np
+import s2sphere  # type: ignore
+
+if typing.TYPE_CHECKING:
+    from stravaviz.track import Track
+
+# A rectangle in degrees: lat_lo, lat_hi, lng_lo, lng_hi; lng_lo > lng_hi if it crosses the antimeridian.
+Rect = typing.Tuple[float, float, float, float]
+# The rectangle containing nothing (lat_lo > lat_hi).
+EMPTY_RECT: Rect = (90.0, -90.0, 180.0, -180.0)
+
+
+def rect_from_latlngrect(rect: s2sphere.LatLngRect) -> Rect:
+    return rect.lat_lo().degrees, rect.lat_hi().degrees, rect.lng_lo().degrees, rect.lng_hi().degrees
+
+
+def latlngrect_from_rect(rect: Rect) -> s2sphere.LatLngRect:
+    lat_lo, lat_hi, lng_lo, lng_hi = rect
+    if lat_lo > lat_hi:
+        return s2sphere.LatLngRect()
+    return s2sphere.LatLngRect(
+        s2sphere.LineInterval(math.radians(lat_lo), math.radians(lat_hi)),
+        s2sphere.SphereInterval(math.radians(lng_lo), math.radians(lng_hi)),
+    )
+
+
+def point_bboxes(lats: np.ndarray, lngs: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Compute border boxes of consecutive runs of points (offsets as in Track) as rows of Rects.
+
+    The longitude interval is the narrower of the plain min/max and the min/max of longitudes shifted to
+    [0, 360), so runs crossing the antimeridian get inverted intervals instead of spanning the whole globe.
+    Rows of empty runs are NaN.
+    """
+    boxes = np.full((len(offsets) - 1, 4), np.nan)
+    non_empty = np.flatnonzero(np.diff(offsets) > 0)
+    if len(non_empty) == 0:
+        return boxes
+    starts = offsets[non_empty]
+    boxes[non_empty, 0] = np.minimum.reduceat(lats, starts)
+    boxes[non_empty, 1] = np.maximum.reduceat(lats, starts)
+    lng_lo = np.minimum.reduceat(lngs, starts)
+    lng_hi = np.maximum.reduceat(lngs, starts)
+    shifted = np.where(lngs < 0, lngs + 360, lngs)
+    shifted_lo = np.minimum.reduceat(shifted, starts)
+    shifted_hi = np.maximum.reduceat(shifted, starts)
+    narrower = shifted_hi - shifted_lo < lng_hi - lng_lo
+    boxes[non_empty, 2] = np.where(narrower, np.where(shifted_lo > 180, shifted_lo - 360, shifted_lo), lng_lo)
+    boxes[non_empty, 3] = np.where(narrower, np.where(shifted_hi > 180, shifted_hi - 360, shifted_hi), lng_hi)
+    return boxes
+
+
+def union(rects: np.ndarray) -> Rect:
+    """Return the smallest Rect containing all rows of rects (NaN and empty rows are ignored).
+
+    The longitude interval is the complement of the largest gap between the (circular) longitude intervals.
+    """
+    rects = rects[~np.isnan(rects[:, 0]) & (rects[:, 0] <= rects[:, 1])]
+    if len(rects) == 0:
+        return EMPTY_RECT
+    lat_lo, lat_hi = float(rects[:, 0].min()), float(rects[:, 1].max())
+    lengths = np.where(rects[:, 2] <= rects[:, 3], rects[:, 3] - rects[:, 2], rects[:, 3] - rects[:, 2] + 360)
+    if lengths.max() >= 360:
+        return lat_lo, lat_hi, -180.0, 180.0
+    order = np.argsort(rects[:, 2], kind="stable")
+    starts = rects[order, 2]
+    reach = np.maximum.accumulate(starts + lengths[order])
+    gaps = np.append(starts[1:] - reach[:-1], starts[0] + 360 - reach[-1])
+    k = int(np.argmax(gaps))
+    if gaps[k] <= 0:
+        return lat_lo, lat_hi, -180.0, 180.0
+    if k == len(starts) - 1:
+        lng_lo, lng_hi = float(starts[0]), float(reach[-1])
+    else:
+        lng_lo, lng_hi = float(starts[k + 1]), float(reach[k])
+    return lat_lo, lat_hi, lng_lo, lng_hi - 360 if lng_hi > 180 else lng_hi
+
+
+def _lng_ranges(rect: Rect) -> typing.List[typing.Tuple[float, float]]:
+    _, _, lng_lo, lng_hi = rect
+    if lng_lo > lng_hi:
+        return [(lng_lo, 180.0), (-180.0, lng_hi)]
+    return [(lng_lo, lng_hi)]
+
+
+def intersects(a: Rect, b: Rect) -> bool:
+    """Return True if the two rectangles intersect (antimeridian aware)."""
+    if a[0] > b[1] or b[0] > a[1]:
+        return False
+    return any(lo1 <= hi2 and lo2 <= hi1 for lo1, hi1 in _lng_ranges(a) for lo2, hi2 in _lng_ranges(b))
+
+
+class SpatialIndex:
+    """Index of rectangles (e.g. track bounding boxes) for fast intersection queries.
+
+    Rectangles are registered in every cell of a uniform lat/lng grid they overlap, a query only
+    looks at the items registered in the cells the query rectangle overlaps.
+
+    Attributes:
+        cell_size: Size of grid cells in degrees.
+
+    Methods:
+        insert: Add an item with its rectangle.
+        query: Return items whose rectangles intersect the given rectangle.
+    """
+
+    def __init__(self, cell_size: float = 0.5) -> None:
+        self.cell_size = cell_size
+        self._cells: typing.Dict[typing.Tuple[int, int], typing.List[int]] = {}
+        self._rects: typing.Dict[int, Rect] = {}
+
+    def __len__(self) -> int:
+        return len(self._rects)
+
+    def _cell_keys(self, rect: Rect) -> typing.Iterator[typing.Tuple[int, int]]:
+        lat_lo, lat_hi, _, _ = rect
+        max_lat_cell = math.floor(180 / self.cell_size)
+        max_lng_cell = math.floor(360 / self.cell_size)
+        lat_cells = range(
+            max(0, math.floor((lat_lo + 90) / self.cell_size)),
+            min(max_lat_cell, math.floor((lat_hi + 90) / self.cell_size)) + 1,
+        )
+        for lng_lo, lng_hi in _lng_ranges(rect):
+            lng_cells = range(
+                max(0, math.floor((lng_lo + 180) / self.cell_size)),
+                min(max_lng_cell, math.floor((lng_hi + 180) / self.cell_size)) + 1,
+            )
+            for i in lat_cells:
+                for j in lng_cells:
+                    yield i, j
+
+    def insert(self, item: int, rect: Rect) -> None:
+        """Add item covering rect (in degrees, see Rect); empty rectangles (lat_lo > lat_hi) are ignored."""
+        if rect[0] > rect[1]:
+            return
+        self._rects[item] = rect
+        for key in self._cell_keys(rect):
+            self._cells.setdefault(key, []).append(item)
+
+    def query(self, rect: Rect) -> typing.List[int]:
+        """Return sorted items whose rectangles intersect rect."""
+        if rect[0] > rect[1]:
+            return []
+        candidates: typing.Set[int] = set()
+        for key in self._cell_keys(rect):
+            candidates.update(self._cells.get(key, ()))
+        return sorted(item for item in candidates if intersects(self._rects[item], rect))
+
+
+class TrackIndex:
+    """Two-level spatial index of tracks: track bounding boxes in a SpatialIndex, and the bounding boxes
+    of the segments of each track, which are filtered with array operations.
+
+    Methods:
+        query: Return tracks and their segments intersecting a rectangle.
+    """
+
+    def __init__(self, tracks: typing.Sequence["Track"], cell_size: float = 0.5) -> None:
+        self._index = SpatialIndex(cell_size)
+        self._segment_bboxes = [tr.segment_bboxes() for tr in tracks]
+        for i, tr in enumerate(tracks):
+            self._index.insert(i, tr.bounds())
+
+    def query(self, rect: Rect) -> typing.List[typing.Tuple[int, np.ndarray]]:
+        """Return (track index, indices of its segments) of all segments whose bounding boxes intersect rect."""
+        result = []
+        for i in self._index.query(rect):
+            boxes = self._segment_bboxes[i]
+            inverted = boxes[:, 2] > boxes[:, 3]
+            lng_overlap = np.zeros(len(boxes), dtype=bool)
+            for lng_lo, lng_hi in _lng_ranges(rect):
+                starts_before, ends_after = boxes[:, 2] <= lng_hi, boxes[:, 3] >= lng_lo
+                lng_overlap |= np.where(inverted, starts_before | ends_after, starts_before & ends_after)
+            segments = np.flatnonzero((boxes[:, 0] <= rect[1]) & (boxes[:, 1] >= rect[0]) & lng_overlap)
+            if len(segments) > 0:
+                result.append((i, segments))
+        return result
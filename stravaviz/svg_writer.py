@@ -0,0 +1,197 @@
+import contextlib
+import re
+import types
+import typing
+from xml.sax.saxutils import quoteattr
+
+import numpy as np
+
+from stravaviz import defaults, profiling
+
+DEFAULT_PRECISION = defaults.PRECISION
+
+
+def format_points(points: np.ndarray, precision: typing.Optional[int] = DEFAULT_PRECISION) -> str:
+    """Format an (n, 2) array of points as "x,y x,y ..." with the given number of decimal places (all if None)."""
+    if precision is not None:
+        # adding 0.0 turns -0.0 into 0.0
+        points = np.round(points, precision) + 0.0
+    return " ".join(f"{x},{y}" for x, y in points.tolist())
+
+
+def format_numbers(values: np.ndarray, precision: typing.Optional[int] = DEFAULT_PRECISION) -> str:
+    """Format numbers as compactly as possible for path data, e.g. [0.5, -1.2, 3.0] as ".5-1.2,3".
+
+    If precision is given, the values are integers in units of 10^-precision (as produced by quantize).
+    """
+    if precision is None:
+        text = ",".join(map(repr, values.tolist()))
+    else:
+        text = ",".join(f"{v:.{precision}f}" for v in (values / 10**precision).tolist())
+    # trailing zeros and dots, leading zeros, commas in front of minus signs
+    text = re.sub(r"(\.\d*?)0+(?=,|$)", r"\1", text)
+    text = re.sub(r"\.(?=,|$)", "", text)
+    text = re.sub(r"(^|,|-)0\.(?=\d)", r"\1.", text)
+    return text.replace(",-", "-")
+
+
+def quantize(points: np.ndarray, precision: typing.Optional[int] = DEFAULT_PRECISION) -> np.ndarray:
+    """Round points to integers in units of 10^-precision (unchanged if precision is None).
+
+    Differences of quantized points are exact, so relative coordinates don't accumulate rounding errors.
+    """
+    if precision is None:
+        return points
+    return np.round(points * 10**precision).astype(np.int64)
+
+
+class SvgWriter:
+    """Write an SVG document element by element straight to a file.
+
+    Unlike building the document as a tree and serializing it at the end, memory does not grow with the
+    size of the document. Elements inherit presentation attributes (stroke, fill, ...) from their groups,
+    so attributes shared by many elements should be set on a group once.
+
+    With merge_paths, consecutive paths within a group (e.g. all tracks of a year) are written as a single
+    <path> element with relative coordinates ("M x,y l dx,dy ... m dx,dy l ..."), which renders the same
+    but is much smaller and has far fewer elements for viewers to handle.
+
+    Use as context manager, which writes the document header on entering and closes all open groups
+    and the document on exit.
+
+    Attributes:
+        precision: Number of decimal places of coordinates (all if None).
+        merge_paths: Merge consecutive paths into one element.
+        elements: Number of elements written (paths, groups, ...).
+        lines: Number of lines written as (sub)paths.
+        points: Number of points of the lines.
+
+    Methods:
+        rect: Write a rectangle.
+        path: Write a path made of one or more lines.
+        group: Context manager that wraps the elements written within in a group.
+        open_group: Start a group.
+        close_group: End the innermost open group.
+    """
+
+    def __init__(
+        self,
+        file: typing.TextIO,
+        width: float,
+        height: float,
+        *,
+        unit: str = "mm",
+        precision: typing.Optional[int] = DEFAULT_PRECISION,
+        merge_paths: bool = False,
+    ) -> None:
+        self.precision = precision
+        self.merge_paths = merge_paths
+        self.elements = 0
+        self.lines = 0
+        self.points = 0
+        self._file = file
+        self._width = width
+        self._height = height
+        self._unit = unit
+        self._open_groups = 0
+        # attributes and current point (quantized) of the merged path being written, if any
+        self._path_attributes: typing.Optional[typing.Dict[str, typing.Any]] = None
+        self._point: typing.Optional[np.ndarray] = None
+
+    def __enter__(self) -> "SvgWriter":
+        self._file.write('<?xml version="1.0" encoding="utf-8" ?>\n')
+        self._file.write(
+            f'<svg xmlns="http://www.w3.org/2000/svg" version="1.1" width="{self._width}{self._unit}" '
+            f'height="{self._height}{self._unit}" viewBox="0 0 {self._width} {self._height}">\n'
+        )
+        return self
+
+    def __exit__(
+        self,
+        exc_type: typing.Optional[typing.Type[BaseException]],
+        exc: typing.Optional[BaseException],
+        traceback: typing.Optional[types.TracebackType],
+    ) -> None:
+        self._end_path()
+        while self._open_groups > 0:
+            self.close_group()
+        self._file.write("</svg>\n")
+
+    def rect(self, x: float, y: float, width: float, height: float, **attributes: typing.Any) -> None:
+        self._element("rect", {"x": x, "y": y, "width": width, "height": height, **attributes})
+
+    def path(self, lines: typing.Iterable[np.ndarray], **attributes: typing.Any) -> None:
+        """Write a path with one subpath per line ((n, 2) arrays of points); nothing is written for no points.
+
+        With merge_paths, the lines are appended to the current path if it has the same attributes, and lines
+        of a single point (which are not visible) are dropped.
+        """
+        with profiling.stage("serialize"):
+            if self.merge_paths:
+                self._merge_path(lines, attributes)
+                return
+            lines = [line for line in lines if len(line) > 0]
+            if lines:
+                d = " ".join(f"M{format_points(line, self.precision)}" for line in lines)
+                self._element("path", {"d": d, **attributes})
+                self.lines += len(lines)
+                self.points += sum(len(line) for line in lines)
+
+    @contextlib.contextmanager
+    def group(self, **attributes: typing.Any) -> typing.Iterator[None]:
+        self.open_group(**attributes)
+        yield
+        self.close_group()
+
+    def open_group(self, **attributes: typing.Any) -> None:
+        """Start a group; underscores in attribute names are written as dashes (stroke_width="0.5")."""
+        self._end_path()
+        self._file.write(f"<g{self._attributes(attributes)}>\n")
+        self._open_groups += 1
+        self.elements += 1
+
+    def close_group(self) -> None:
+        assert self._open_groups > 0
+        self._end_path()
+        self._file.write("</g>\n")
+        self._open_groups -= 1
+
+    def _merge_path(self, lines: typing.Iterable[np.ndarray], attributes: typing.Dict[str, typing.Any]) -> None:
+        if self._path_attributes is not None and self._path_attributes != attributes:
+            self._end_path()
+        for line in lines:
+            if len(line) < 2:
+                continue
+            points = quantize(line, self.precision)
+            if self._path_attributes is None:
+                self._file.write(f'<path{self._attributes(attributes)} d="')
+                self._path_attributes = attributes
+                self.elements += 1
+                move = f"M{format_numbers(points[0], self.precision)}"
+            else:
+                assert self._point is not None
+                move = f"m{format_numbers(points[0] - self._point, self.precision)}"
+            steps = np.diff(points, axis=0)
+            # steps that vanished by rounding are dropped, but a line needs at least one step to be drawn
+            steps = steps[(steps != 0).any(axis=1)]
+            if len(steps) == 0:
+                steps = np.zeros((1, 2), dtype=points.dtype)
+            self._file.write(f"{move}l{format_numbers(steps.reshape(-1), self.precision)}")
+            self._point = points[-1]
+            self.lines += 1
+            self.points += len(line)
+
+    def _end_path(self) -> None:
+        if self._path_attributes is not None:
+            self._file.write('" />\n')
+            self._path_attributes = None
+            self._point = None
+
+    def _element(self, tag: str, attributes: typing.Dict[str, typing.Any]) -> None:
+        self._end_path()
+        self._file.write(f"<{tag}{self._attributes(attributes)} />\n")
+        self.elements += 1
+
+    @staticmethod
+    def _attributes(attributes: typing.Dict[str, typing.Any]) -> str:
+        return "".join(f" {name.replace('_', '-')}={quoteattr(str(value))}" for name, value in attributes.items())
@@ -0,0 +1,251 @@
+import json
+import logging
+import math
+import os
+import re
+import typing
+
+import numpy as np
+
+from stravaviz import raster, utils
+from stravaviz.exceptions import ParameterError
+from stravaviz.spatial_index import Rect, SpatialIndex
+from stravaviz.track import Track, track_fingerprint, track_key
+
+log = logging.getLogger(__name__)
+
+TILE_SIZE = 256
+MAX_ZOOM = 22
+# Web Mercator is cut off at this latitude
+MAX_LATITUDE = 85.0511287798
+MANIFEST_VERSION = 1
+# density (length of lines in pixels per pixel) that is drawn fully opaque
+REFERENCE_DENSITY = 8.0
+
+
+def parse_zoom_range(s: str) -> typing.Tuple[int, int]:
+    """Parse "Z" or "Z_MIN-Z_MAX" into a pair of zoom levels.
+
+    Raises:
+        ParameterError: The string is not a valid zoom range.
+    """
+    m = re.match(r"^(\d+)(?:-(\d+))?$", s)
+    if not m:
+        raise ParameterError(f"Not a valid zoom range: {s}")
+    z_min = int(m.group(1))
+    z_max = int(m.group(2)) if m.group(2) else z_min
+    if z_min > z_max or z_max > MAX_ZOOM:
+        raise ParameterError(f"Not a valid zoom range: {s} (must be Z_MIN-Z_MAX with Z_MIN <= Z_MAX <= {MAX_ZOOM})")
+    return z_min, z_max
+
+
+def tile_rect(zoom: int, x: int, y: int) -> Rect:
+    """Rectangle (degrees) covered by the given tile."""
+    n = 2**zoom
+
+    def tile_lat(ty: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+
+    return tile_lat(y + 1), tile_lat(y), x / n * 360 - 180, (x + 1) / n * 360 - 180
+
+
+def world_pixels(lats: np.ndarray, lngs: np.ndarray, zoom: int) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """Project coordinates to pixel coordinates of the whole Web Mercator world at the given zoom."""
+    scale = 2**zoom * TILE_SIZE
+    xs = utils.lng2x_array(lngs) / 2 * scale
+    ys = (utils.lat2y_array(np.clip(lats, -MAX_LATITUDE, MAX_LATITUDE)) + 0.5) / 2 * scale
+    return xs, ys
+
+
+def _pairs(xs: np.ndarray, offsets: np.ndarray, zoom: int) -> np.ndarray:
+    """Mask of consecutive points (i, i + 1) that form a line.
+
+    Points of different segments are not connected, and neither are points on opposite sides of the antimeridian.
+    """
+    if len(xs) < 2:
+        return np.zeros(0, dtype=bool)
+    connected = np.abs(np.diff(xs)) < 2**zoom * TILE_SIZE / 2
+    starts = offsets[1:-1]
+    connected[starts[(starts > 0) & (starts < len(xs))] - 1] = False
+    return connected
+
+
+def touched_tiles(xs: np.ndarray, ys: np.ndarray, offsets: np.ndarray, zoom: int) -> typing.Set[typing.Tuple[int, int]]:
+    """Return (x, y) of all tiles the bounding boxes of the lines between consecutive points overlap."""
+    n = 2**zoom
+    if len(xs) == 0:
+        return set()
+    txs = np.clip(np.floor(xs / TILE_SIZE), 0, n - 1).astype(np.int64)
+    tys = np.clip(np.floor(ys / TILE_SIZE), 0, n - 1).astype(np.int64)
+    keys = set((txs * n + tys).tolist())
+    # lines between points in different tiles may cross further tiles
+    pairs = np.flatnonzero(_pairs(xs, offsets, zoom) & ((txs[:-1] != txs[1:]) | (tys[:-1] != tys[1:])))
+    for i in pairs.tolist():
+        for tx in range(min(txs[i], txs[i + 1]), max(txs[i], txs[i + 1]) + 1):
+            for ty in range(min(tys[i], tys[i + 1]), max(tys[i], tys[i + 1]) + 1):
+                keys.add(tx * n + ty)
+    return {(key // n, key % n) for key in keys}
+
+
+def rect_tiles(rect: Rect, zoom: int) -> typing.Set[typing.Tuple[int, int]]:
+    """Return (x, y) of all tiles overlapping the rectangle."""
+    lat_lo, lat_hi, lng_lo, lng_hi = rect
+    if lat_lo > lat_hi:
+        return set()
+    n = 2**zoom
+    corner_xs, corner_ys = world_pixels(np.array([lat_hi, lat_lo]), np.array([lng_lo, lng_hi]), zoom)
+    ty_lo, ty_hi = (int(min(max(v // TILE_SIZE, 0), n - 1)) for v in corner_ys)
+    tx_lo, tx_hi = (int(min(max(v // TILE_SIZE, 0), n - 1)) for v in corner_xs)
+    x_ranges = [range(tx_lo, n), range(0, tx_hi + 1)] if lng_lo > lng_hi else [range(tx_lo, tx_hi + 1)]
+    return {(tx, ty) for xr in x_ranges for tx in xr for ty in range(ty_lo, ty_hi + 1)}
+
+
+def tile_lines(
+    xs: np.ndarray, ys: np.ndarray, offsets: np.ndarray, zoom: int, x: int, y: int
+) -> typing.List[np.ndarray]:
+    """Return the parts of the lines that are visible in the tile, in pixel coordinates of the tile."""
+    if len(xs) < 2:
+        return []
+    local_xs = xs - x * TILE_SIZE
+    local_ys = ys - y * TILE_SIZE
+    # keep the lines between consecutive points whose bounding box overlaps the tile (with a margin of one pixel)
+    visible = (
+        (np.maximum(local_xs[:-1], local_xs[1:]) >= -1)
+        & (np.minimum(local_xs[:-1], local_xs[1:]) <= TILE_SIZE + 1)
+        & (np.maximum(local_ys[:-1], local_ys[1:]) >= -1)
+        & (np.minimum(local_ys[:-1], local_ys[1:]) <= TILE_SIZE + 1)
+        & _pairs(xs, offsets, zoom)
+    )
+    pairs = np.flatnonzero(visible)
+    if len(pairs) == 0:
+        return []
+    points = np.column_stack((local_xs, local_ys))
+    lines = []
+    for run in np.split(pairs, np.flatnonzero(np.diff(pairs) != 1) + 1):
+        lines.append(points[run[0] : run[-1] + 2])
+    return lines
+
+
+class TileRenderer:
+    """Render the heatmap as a pyramid of slippy map tiles ({zoom}/{x}/{y}.png, 256x256 pixels, Web Mercator).
+
+    Tiles are transparent PNGs with the track color, whose opacity follows the density of tracks, using the same
+    ramp for all tiles. Each tile only draws the tracks whose bounding boxes intersect it (looked up in a spatial
+    index). Empty tiles are not written.
+
+    A manifest in the output directory records the tracks the tiles were rendered from. Rendering again
+    into the same directory only re-renders tiles touched by tracks that were added, changed or removed since.
+
+    Attributes:
+        tracks: Tracks to render.
+        zoom_range: Lowest and highest zoom level to render.
+        color: Color of the tracks.
+
+    Methods:
+        render: Render (or update) the tiles in a directory.
+    """
+
+    def __init__(self, tracks: typing.List[Track], zoom_range: typing.Tuple[int, int], color: str) -> None:
+        self.tracks = tracks
+        self.zoom_range = zoom_range
+        self.color = color
+        self._rects = [tr.bounds() for tr in tracks]
+        self._index = SpatialIndex()
+        for i, rect in enumerate(self._rects):
+            self._index.insert(i, rect)
+
+    def render(self, output_dir: str) -> int:
+        """Render all tiles affected by changes since the last rendering into output_dir.
+
+        Returns:
+            Number of rendered tiles.
+        """
+        manifest_file_name = os.path.join(output_dir, "manifest.json")
+        params = {"zooms": list(self.zoom_range), "color": self.color, "reference": REFERENCE_DENSITY}
+        manifest = self._load_manifest(manifest_file_name)
+        current = {
+            track_key(tr): {"fingerprint": track_fingerprint(tr), "bbox": list(rect)}
+            for tr, rect in zip(self.tracks, self._rects)
+        }
+        if manifest.get("params") == params:
+            previous = manifest.get("tracks", {})
+            fingerprints = {key: entry["fingerprint"] for key, entry in current.items()}
+            added = [
+                i
+                for i, tr in enumerate(self.tracks)
+                if previous.get(track_key(tr), {}).get("fingerprint") != fingerprints[track_key(tr)]
+            ]
+            removed = [
+                entry["bbox"] for key, entry in previous.items() if fingerprints.get(key) != entry["fingerprint"]
+            ]
+            log.info("Tiles: %d track(s) added or changed, %d removed or changed", len(added), len(removed))
+        else:
+            added = list(range(len(self.tracks)))
+            removed = []
+
+        count = 0
+        for zoom in range(self.zoom_range[0], self.zoom_range[1] + 1):
+            projected: typing.Dict[int, typing.Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+            dirty: typing.Set[typing.Tuple[int, int]] = set()
+            for i in added:
+                xs, ys, offsets = self._project(i, zoom, projected)
+                dirty.update(touched_tiles(xs, ys, offsets, zoom))
+            for rect in removed:
+                dirty.update(rect_tiles(typing.cast(Rect, tuple(rect)), zoom))
+            for x, y in sorted(dirty):
+                if self._render_tile(output_dir, zoom, x, y, projected):
+                    count += 1
+            log.info("Tiles: updated %d tile(s) at zoom %d", len(dirty), zoom)
+
+        os.makedirs(output_dir, exist_ok=True)
+        with open(manifest_file_name, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "params": params, "tracks": current}, f)
+        return count
+
+    @staticmethod
+    def _load_manifest(file_name: str) -> typing.Dict[str, typing.Any]:
+        try:
+            with open(file_name, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+            return {}
+        return manifest
+
+    def _project(
+        self, i: int, zoom: int, projected: typing.Dict[int, typing.Tuple[np.ndarray, np.ndarray, np.ndarray]]
+    ) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if i not in projected:
+            tr = self.tracks[i]
+            lat_lo, lat_hi, _, _ = self._rects[i]
+            max_lat = min(max(abs(lat_lo), abs(lat_hi)), MAX_LATITUDE)
+            meters_per_pixel = 360 * utils.ONE_DEGREE * math.cos(math.radians(max_lat)) / (2**zoom * TILE_SIZE)
+            # half a pixel of simplification error is invisible on anti-aliased tiles
+            lats, lngs, offsets = tr.level_of_detail(meters_per_pixel / 2)
+            xs, ys = world_pixels(lats, lngs, zoom)
+            projected[i] = xs, ys, offsets
+        return projected[i]
+
+    def _render_tile(
+        self,
+        output_dir: str,
+        zoom: int,
+        x: int,
+        y: int,
+        projected: typing.Dict[int, typing.Tuple[np.ndarray, np.ndarray, np.ndarray]],
+    ) -> bool:
+        file_name = os.path.join(output_dir, str(zoom), str(x), f"{y}.png")
+        density = raster.DensityRaster(TILE_SIZE, TILE_SIZE)
+        for i in self._index.query(tile_rect(zoom, x, y)):
+            xs, ys, offsets = self._project(i, zoom, projected)
+            for line in tile_lines(xs, ys, offsets, zoom, x, y):
+                density.add_line(line)
+        if not density.counts.any():
+            if os.path.exists(file_name):
+                os.remove(file_name)
+            return False
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        with open(file_name, "wb") as f:
+            raster.write_png(f, density.colorize_alpha(self.color, REFERENCE_DENSITY))
+        return True
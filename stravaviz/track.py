@@ -1,73 +1,298 @@
 import datetime
+import io
 import json
 import os
 import typing
+import xml.etree.ElementTree as ET
+import zipfile
+import zlib
 
 import gpxpy  # type: ignore
-import pint  # type: ignore
+import numpy as np
 import s2sphere  # type: ignore
-import polyline  # type: ignore
 
 from stravaviz.exceptions import TrackLoadError
-from stravaviz.units import Units
+from stravaviz import defaults, fit_reader, gpx_reader, profiling, spatial_index, track_files, utils
+from stravaviz.simplify import levels_of_detail, simplify_segments, subset_offsets
 
+if typing.TYPE_CHECKING:
+    import pint  # type: ignore
 
-class Track:
+# Bump whenever the layout of cached tracks (or the way they are simplified) changes.
+CACHE_VERSION = 4
+DEFAULT_SIMPLIFY_TOLERANCE = defaults.SIMPLIFY_TOLERANCE
+# Coarser levels of detail kept for each track, as multiples of the simplification tolerance.
+DETAIL_FACTORS = (4, 16, 64)
+
+
+class Track:  # pylint: disable=too-many-public-methods
     """Create and maintain info about a given activity track (corresponding to one GPX file).
 
+    Points of all segments are stored in contiguous float64 arrays (degrees and meters); segment i spans
+    the points offsets[i]:offsets[i + 1].
+
     Attributes:
-        file_names: Basename of a given file passed in load_gpx.
-        polylines: Lines interpolated between each coordinate.
+        file_names: Basename of a given file passed in load_file.
+        lats: Latitudes of all points.
+        lngs: Longitudes of all points.
+        eles: Elevations of all points.
+        dists: Distance (meters) along the track from its start to each point, computed before simplification.
+        times: Time (seconds) elapsed from the start time to each point, NaN if unknown.
+        offsets: Start index of each segment, followed by the total number of points.
+        raw_points: Number of points before simplification (0 if unknown, e.g. for cached tracks).
+        simplify_tolerance: Tolerance (meters) the points were simplified with.
+        details: Coarser levels of detail as (tolerance, indices of the kept points) pairs.
+        polylines: Lines interpolated between each coordinate (built on demand).
+        elevations: Elevations of each segment (views into eles).
         start_time: Activity start time.
         end_time: Activity end time.
         length: Length of the track (2-dimensional).
         self.special: True if track is special, else False.
 
     Methods:
-        load_gpx: Load a GPX file into the current track.
-        bbox: Compute the border box of the track.
-        append: Append other track to current track.
+        load_file: Load a GPX or FIT file into the current track.
+        set_segments: Replace points of the track by the given segments.
+        simplify: Simplify the track and precompute coarser levels of detail.
+        level_of_detail: Return the coarsest points within a given tolerance.
+        segments: Iterate over (lats, lngs) of each segment.
+        bbox: Return the border box of the track.
+        bounds: Return the border box of the track as a spatial_index.Rect.
+        segment_bboxes: Return the border boxes of all segments.
+        concatenate: Return a track made of several tracks.
+        append: Append another track to the current track.
         load_cache: Load track from cached json data.
         store_cache: Cache the current track.
+        pack: Return metadata and a raw buffer of the points, for transfer between processes.
+        unpack: Create a track from packed metadata and buffer.
     """
 
     def __init__(self) -> None:
         self.file_names: typing.List[str] = []
-        self.polylines: typing.List[typing.List[s2sphere.LatLng]] = []
-        self.elevations = []
+        self.lats = np.empty(0, dtype=np.float64)
+        self.lngs = np.empty(0, dtype=np.float64)
+        self.eles = np.empty(0, dtype=np.float64)
+        self.dists = np.empty(0, dtype=np.float64)
+        self.times = np.empty(0, dtype=np.float64)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.raw_points = 0
+        self.simplify_tolerance = 0.0
+        self.details: typing.List[typing.Tuple[float, np.ndarray]] = []
+        # border boxes are computed whenever the points change, so drawers never scan the points for them
+        self._segment_bboxes = np.empty((0, 4), dtype=np.float64)
+        self._bbox = spatial_index.EMPTY_RECT
         self._start_time: typing.Optional[datetime.datetime] = None
         self._end_time: typing.Optional[datetime.datetime] = None
-        # Don't use Units().meter here, as this constructor is called from
-        # within a thread (which would create a second unit registry!)
         self._length_meters = 0.0
         self.special = False
 
-    def load_gpx(self, file_name: str) -> None:
-        """Load the GPX file into self.
+    def load_file(
+        self, file_name: str, parser: str = "gpxpy", simplify_tolerance: float = DEFAULT_SIMPLIFY_TOLERANCE
+    ) -> None:
+        """Load the activity file (GPX or FIT, possibly compressed or in a zip archive) into self.
 
         Args:
-            file_name: GPX file to be loaded .
+            file_name: Activity file to be loaded (see track_files.list_track_files).
+            parser: "gpxpy" to parse the whole GPX document with gpxpy, "fast" to stream only the track points.
+            simplify_tolerance: Largest distance (meters) of a dropped point from the simplified track.
 
         Raises:
-            TrackLoadError: An error occurred while parsing the GPX file (empty or bad format).
-            PermissionError: An error occurred while opening the GPX file.
+            TrackLoadError: An error occurred while reading the file (empty, bad format or bad permissions).
         """
+        self._load(lambda: track_files.open_track_file(file_name), file_name, parser, simplify_tolerance)
+
+    def load_stream(
+        self,
+        file: typing.BinaryIO,
+        file_name: str,
+        parser: str = "gpxpy",
+        simplify_tolerance: float = DEFAULT_SIMPLIFY_TOLERANCE,
+    ) -> None:
+        """Load an activity from a binary file object (e.g. io.BytesIO) into self, like load_file.
+
+        Args:
+            file: Contents of the activity file.
+            file_name: Name of the activity file; its suffix gives the format (see track_files.SUFFIXES).
+            parser: "gpxpy" to parse the whole GPX document with gpxpy, "fast" to stream only the track points.
+            simplify_tolerance: Largest distance (meters) of a dropped point from the simplified track.
+
+        Raises:
+            TrackLoadError: An error occurred while reading the file (empty or bad format).
+        """
+        self._load(lambda: track_files.decompress(file, file_name), file_name, parser, simplify_tolerance)
+
+    def _load(
+        self,
+        open_file: typing.Callable[[], typing.ContextManager[typing.BinaryIO]],
+        file_name: str,
+        parser: str,
+        simplify_tolerance: float,
+    ) -> None:
         try:
             self.file_names = [os.path.basename(file_name)]
-            # Handle empty gpx files
-            # (for example, treadmill runs pulled via garmin-connect-export)
-            if os.path.getsize(file_name) == 0:
-                raise TrackLoadError("Empty GPX file")
-            with open(file_name, "r") as file:
-                self._load_gpx_data(gpxpy.parse(file))
+            file_format = track_files.track_file_format(file_name)
+            with profiling.stage("parse file"), open_file() as binary_file:
+                if hasattr(binary_file, "peek"):
+                    self._read(binary_file, file_format, parser)
+                else:
+                    reader = io.BufferedReader(typing.cast(typing.Any, binary_file))
+                    try:
+                        self._read(typing.cast(typing.BinaryIO, reader), file_format, parser)
+                    finally:
+                        # the reader would close the caller's file when it is collected
+                        reader.detach()
+            self.simplify(simplify_tolerance)
+            if np.isnan(self.eles).any() or not self.eles.all():
+                raise TrackLoadError("Track has invalid elevations.")
         except TrackLoadError as e:
             raise e
-        except gpxpy.gpx.GPXXMLSyntaxException as e:
+        except (gpxpy.gpx.GPXXMLSyntaxException, ET.ParseError) as e:
             raise TrackLoadError("Failed to parse GPX.") from e
+        except (EOFError, zlib.error, zipfile.BadZipFile) as e:
+            raise TrackLoadError("Failed to decompress file.") from e
         except PermissionError as e:
-            raise TrackLoadError("Cannot load GPX (bad permissions)") from e
+            raise TrackLoadError("Cannot load file (bad permissions)") from e
+        except Exception as e:
+            raise TrackLoadError("Something went wrong when loading the file.") from e
+
+    def _read(self, binary_file: typing.BinaryIO, file_format: str, parser: str) -> None:
+        # Handle empty files
+        # (for example, treadmill runs pulled via garmin-connect-export)
+        if not binary_file.peek(1):  # type: ignore
+            raise TrackLoadError(f"Empty {file_format.upper()} file")
+        if file_format == "fit":
+            self._load_streamed_gpx_data(fit_reader.read_fit(binary_file))
+        elif parser == "fast":
+            self._load_streamed_gpx_data(gpx_reader.read_gpx(binary_file))
+        else:
+            text_file = io.TextIOWrapper(binary_file, encoding="utf-8")
+            try:
+                self._load_gpx_data(gpxpy.parse(text_file))
+            finally:
+                text_file.detach()
+
+    def load_cache(self, cache_file_name: str, stamp: typing.Tuple[int, int], simplify_tolerance: float) -> None:
+        """Load the track from a previously cached track.
+
+        Args:
+            cache_file_name: Filename of the cached track to be loaded.
+            stamp: Modification time (ns) and size of the source file, the cache is rejected if they differ.
+            simplify_tolerance: Expected simplification tolerance, the cache is rejected if it differs.
+
+        Raises:
+            TrackLoadError: The cache file is missing, stale or could not be read.
+        """
+        try:
+            with open(cache_file_name, "r", encoding="utf-8") as data_file:
+                data = json.load(data_file)
+        except FileNotFoundError as e:
+            raise TrackLoadError("Track is not cached.") from e
         except Exception as e:
-            raise TrackLoadError("Something went wrong when loading GPX.") from e
+            raise TrackLoadError("Failed to load track data from cache.") from e
+        if (
+            data.get("version") != CACHE_VERSION
+            or tuple(data.get("stamp", ())) != tuple(stamp)
+            or data.get("tolerance") != simplify_tolerance
+        ):
+            raise TrackLoadError("Cached track is stale.")
+        try:
+            self._start_time = datetime.datetime.fromisoformat(data["start"])
+            self._end_time = datetime.datetime.fromisoformat(data["end"])
+            self._length_meters = float(data["length"])
+            offsets = np.array(data["offsets"], dtype=np.int64)
+            lats, lngs, eles, dists, times = (
+                np.array(data[key], dtype=np.float64) for key in ("lats", "lngs", "eles", "dists", "times")
+            )
+            if (
+                offsets[0] != 0
+                or offsets[-1] != len(lats)
+                or not len(lats) == len(lngs) == len(eles) == len(dists) == len(times)
+            ):
+                raise ValueError("Inconsistent cached points.")
+            self.offsets, self.lats, self.lngs, self.eles = offsets, lats, lngs, eles
+            self.dists, self.times = dists, times
+            self._set_bboxes(np.array(data["bboxes"], dtype=np.float64).reshape(-1, 4))
+            self.simplify_tolerance = simplify_tolerance
+            self.details = [(float(tolerance), np.array(kept, dtype=np.int64)) for tolerance, kept in data["details"]]
+        except Exception as e:
+            raise TrackLoadError("Failed to load track data from cache.") from e
+
+    def store_cache(self, cache_file_name: str, stamp: typing.Tuple[int, int]) -> None:
+        """Cache the current track.
+
+        The cache is written to a temporary file first and moved into place, so concurrent runs never see
+        a partially written cache file.
+        """
+        dir_name = os.path.dirname(cache_file_name)
+        os.makedirs(dir_name, exist_ok=True)
+        data = {
+            "version": CACHE_VERSION,
+            "stamp": list(stamp),
+            "tolerance": self.simplify_tolerance,
+            "start": self.start_time().isoformat(),
+            "end": self.end_time().isoformat(),
+            "length": self._length_meters,
+            "offsets": self.offsets.tolist(),
+            "lats": self.lats.tolist(),
+            "lngs": self.lngs.tolist(),
+            "eles": self.eles.tolist(),
+            "dists": self.dists.tolist(),
+            "times": self.times.tolist(),
+            "details": [[tolerance, kept.tolist()] for tolerance, kept in self.details],
+            "bboxes": self._segment_bboxes.tolist(),
+        }
+        tmp_file_name = f"{cache_file_name}.{os.getpid()}.tmp"
+        with open(tmp_file_name, "w", encoding="utf-8") as json_file:
+            json.dump(data, json_file)
+        os.replace(tmp_file_name, cache_file_name)
+
+    def pack(self) -> typing.Tuple[typing.Dict[str, typing.Any], bytes]:
+        """Return small metadata and a raw buffer with all arrays of the track (see unpack).
+
+        Sending the arrays between processes as one buffer is much cheaper than pickling the track.
+        """
+        arrays = [self.offsets, self.lats, self.lngs, self.eles, self.dists, self.times, self._segment_bboxes]
+        arrays += [kept for _, kept in self.details]
+        metadata = {
+            "file_names": self.file_names,
+            "start": self._start_time,
+            "end": self._end_time,
+            "length": self._length_meters,
+            "tolerance": self.simplify_tolerance,
+            "points": len(self.lats),
+            "raw_points": self.raw_points,
+            "segments": len(self.offsets) - 1,
+            "details": [(tolerance, len(kept)) for tolerance, kept in self.details],
+        }
+        return metadata, b"".join(a.tobytes() for a in arrays)
+
+    @classmethod
+    def unpack(cls, metadata: typing.Dict[str, typing.Any], buffer: typing.Any, offset: int = 0) -> "Track":
+        """Create a track from the metadata and buffer (starting at offset) returned by pack.
+
+        The arrays are copied out of the buffer, so the track doesn't keep the buffer (which may hold the
+        arrays of a whole batch of tracks) alive.
+        """
+
+        def take(dtype: typing.Type[np.generic], count: int) -> np.ndarray:
+            nonlocal offset
+            array = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset).copy()
+            offset += array.nbytes
+            return array
+
+        t = cls()
+        t.file_names = list(metadata["file_names"])
+        t._start_time, t._end_time = metadata["start"], metadata["end"]
+        t._length_meters = metadata["length"]
+        t.simplify_tolerance = metadata["tolerance"]
+        points, segments = metadata["points"], metadata["segments"]
+        t.raw_points = metadata["raw_points"]
+        t.offsets = take(np.int64, segments + 1)
+        t.lats, t.lngs, t.eles = take(np.float64, points), take(np.float64, points), take(np.float64, points)
+        t.dists, t.times = take(np.float64, points), take(np.float64, points)
+        bboxes = take(np.float64, 4 * segments).reshape(-1, 4)
+        t.details = [(tolerance, take(np.int64, size)) for tolerance, size in metadata["details"]]
+        t._set_bboxes(bboxes)
+        return t
 
     def has_time(self) -> bool:
         return self._start_time is not None and self._end_time is not None
@@ -94,16 +319,98 @@ class Track:
     def length_meters(self, value: float) -> None:
         self._length_meters = value
 
-    def length(self) -> pint.quantity.Quantity:
+    def length(self) -> "pint.Quantity":
+        """Return the length as pint quantity; use length_meters where speed matters (this loads pint)."""
+        from stravaviz.units import Units  # pylint: disable=import-outside-toplevel
+
         return self._length_meters * Units().meter
 
+    def set_segments(
+        self,
+        lats: typing.Sequence[np.ndarray],
+        lngs: typing.Sequence[np.ndarray],
+        eles: typing.Sequence[np.ndarray],
+        bboxes: typing.Optional[np.ndarray] = None,
+        times: typing.Optional[typing.Sequence[np.ndarray]] = None,
+    ) -> None:
+        """Replace points of the track by the given segments (one array per segment and coordinate).
+
+        Border boxes of the segments (see segment_bboxes) are computed unless they are given, and so are the
+        distances along the track. Times are elapsed seconds since the start time (unknown if not given).
+        """
+        sizes = [len(line) for line in lats]
+        self.offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=self.offsets[1:])
+        self.lats = np.concatenate(lats) if sizes else np.empty(0, dtype=np.float64)
+        self.lngs = np.concatenate(lngs) if sizes else np.empty(0, dtype=np.float64)
+        self.eles = np.concatenate(eles) if sizes else np.empty(0, dtype=np.float64)
+        self.raw_points = len(self.lats)
+        self.dists = utils.cumulative_distances(self.lats, self.lngs, self.offsets)
+        if times is not None and sizes:
+            self.times = np.concatenate(times).astype(np.float64)
+        else:
+            self.times = np.full(len(self.lats), np.nan)
+        self._set_bboxes(bboxes)
+
+    def _set_bboxes(self, segment_bboxes: typing.Optional[np.ndarray] = None) -> None:
+        if segment_bboxes is None:
+            segment_bboxes = spatial_index.point_bboxes(self.lats, self.lngs, self.offsets)
+        self._segment_bboxes = segment_bboxes
+        self._bbox = spatial_index.union(segment_bboxes)
+
+    def simplify(self, tolerance: float) -> None:
+        """Simplify all segments (Ramer-Douglas-Peucker, tolerance in meters) and precompute coarser details."""
+        with profiling.stage("simplify"):
+            kept = simplify_segments(self.lats, self.lngs, self.offsets, tolerance)
+            self.offsets = subset_offsets(kept, self.offsets)
+            self.lats = self.lats[kept]
+            self.lngs = self.lngs[kept]
+            self.eles = self.eles[kept]
+            self.dists = self.dists[kept]
+            self.times = self.times[kept]
+            self._set_bboxes()
+            self.simplify_tolerance = tolerance
+            self.details = levels_of_detail(
+                self.lats, self.lngs, self.offsets, [tolerance * factor for factor in DETAIL_FACTORS]
+            )
+
+    def level_of_detail(self, max_tolerance: float) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return lats, lngs and offsets of the coarsest level of detail simplified with at most max_tolerance."""
+        for tolerance, kept in reversed(self.details):
+            if tolerance <= max_tolerance:
+                return self.lats[kept], self.lngs[kept], subset_offsets(kept, self.offsets)
+        return self.lats, self.lngs, self.offsets
+
+    def segments(self) -> typing.Iterator[typing.Tuple[np.ndarray, np.ndarray]]:
+        """Iterate over latitudes and longitudes (array views) of each segment."""
+        for start, end in zip(self.offsets[:-1], self.offsets[1:]):
+            yield self.lats[start:end], self.lngs[start:end]
+
+    @property
+    def polylines(self) -> typing.List[typing.List[s2sphere.LatLng]]:
+        return [
+            [s2sphere.LatLng.from_degrees(lat, lng) for lat, lng in zip(lats.tolist(), lngs.tolist())]
+            for lats, lngs in self.segments()
+        ]
+
+    @property
+    def elevations(self) -> typing.List[np.ndarray]:
+        return [self.eles[start:end] for start, end in zip(self.offsets[:-1], self.offsets[1:])]
+
     def bbox(self) -> s2sphere.LatLngRect:
-        """Compute the smallest rectangle that contains the entire track (border box)."""
-        bbox = s2sphere.LatLngRect()
-        for line in self.polylines:
-            for latlng in line:
-                bbox = bbox.union(s2sphere.LatLngRect.from_point(latlng.normalized()))
-        return bbox
+        """Return the smallest rectangle that contains the entire track (border box)."""
+        return spatial_index.latlngrect_from_rect(self._bbox)
+
+    def bounds(self) -> spatial_index.Rect:
+        """Return the border box of the track in degrees (see spatial_index.Rect)."""
+        return self._bbox
+
+    def segment_bboxes(self) -> np.ndarray:
+        """Return border boxes of all segments as (lat_lo, lat_hi, lng_lo, lng_hi) rows in degrees.
+
+        Segments crossing the antimeridian have lng_lo > lng_hi, rows of empty segments are NaN.
+        """
+        return self._segment_bboxes
 
     def _load_gpx_data(self, gpx: gpxpy.gpx.GPX) -> None:
         self._start_time, self._end_time = gpx.get_time_bounds()
@@ -112,20 +419,81 @@ class Track:
         self._length_meters = gpx.length_2d()
         if self._length_meters <= 0:
             raise TrackLoadError("Track is empty.")
-        gpx.simplify()
+        lats, lngs, eles, times = [], [], [], []
+        start_time = self.start_time()
         for t in gpx.tracks:
             for s in t.segments:
-                line = [s2sphere.LatLng.from_degrees(p.latitude, p.longitude) for p in s.points]
-                self.polylines.append(line)
-                elevation_line = [p.elevation for p in s.points]
-                if not all(elevation_line):
-                    raise TrackLoadError("Track has invalid elevations.")
-                self.elevations.append(elevation_line)
+                lats.append(np.array([p.latitude for p in s.points], dtype=np.float64))
+                lngs.append(np.array([p.longitude for p in s.points], dtype=np.float64))
+                eles.append(np.array([p.elevation for p in s.points], dtype=np.float64))
+                times.append(
+                    np.array(
+                        [(p.time - start_time).total_seconds() if p.time else np.nan for p in s.points],
+                        dtype=np.float64,
+                    )
+                )
+        self.set_segments(lats, lngs, eles, times=times)
+
+    def _load_streamed_gpx_data(self, gpx: gpx_reader.StreamedGpx) -> None:
+        self._start_time, self._end_time = gpx.start_time, gpx.end_time
+        if not self.has_time():
+            raise TrackLoadError("Track has no start or end time.")
+        self._length_meters = gpx.length_2d
+        if self._length_meters <= 0:
+            raise TrackLoadError("Track is empty.")
+        self.set_segments(
+            [lats for lats, _, _ in gpx.segments],
+            [lngs for _, lngs, _ in gpx.segments],
+            [eles for _, _, eles in gpx.segments],
+            times=[times - self.start_time().timestamp() for times in gpx.times],
+        )
+
+    @classmethod
+    def concatenate(cls, tracks: typing.Sequence["Track"]) -> "Track":
+        """Return a new track made of the segments of all given tracks (in order), e.g. to merge one activity.
+
+        Every array is built once from slices of the given tracks, which are not modified. The track spans
+        the earliest start and the latest end time, so tracks that overlap in time keep their full span.
+        """
+        t = cls()
+        points = np.cumsum([0] + [len(tr.lats) for tr in tracks])
+        t.offsets = np.concatenate([tracks[0].offsets[:1]] + [tr.offsets[1:] + p for tr, p in zip(tracks, points)])
+        t.lats = np.concatenate([tr.lats for tr in tracks])
+        t.lngs = np.concatenate([tr.lngs for tr in tracks])
+        t.eles = np.concatenate([tr.eles for tr in tracks])
+        # distances continue from the end of the previous track, times count from the start of the first one
+        t._start_time = min(tr.start_time() for tr in tracks)
+        lengths = np.cumsum([0.0] + [tr.dists[-1] if len(tr.dists) > 0 else 0.0 for tr in tracks])
+        t.dists = np.concatenate([tr.dists + length for tr, length in zip(tracks, lengths)])
+        t.times = np.concatenate([tr.times + (tr.start_time() - t._start_time).total_seconds() for tr in tracks])
+        t._segment_bboxes = np.concatenate([tr.segment_bboxes() for tr in tracks])
+        t._bbox = spatial_index.union(np.array([tr.bounds() for tr in tracks]))
+        t.simplify_tolerance = max(tr.simplify_tolerance for tr in tracks)
+        tolerances = [tolerance for tolerance, _ in tracks[0].details]
+        if all([tolerance for tolerance, _ in tr.details] == tolerances for tr in tracks):
+            t.details = [
+                (tolerance, np.concatenate([tr.details[level][1] + p for tr, p in zip(tracks, points)]))
+                for level, tolerance in enumerate(tolerances)
+            ]
+        t._end_time = max(tr.end_time() for tr in tracks)
+        t._length_meters = sum(tr.length_meters for tr in tracks)
+        t.raw_points = sum(tr.raw_points for tr in tracks)
+        t.file_names = [file_name for tr in tracks for file_name in tr.file_names]
+        t.special = any(tr.special for tr in tracks)
+        return t
 
     def append(self, other: "Track") -> None:
-        """Append other track to self."""
-        self._end_time = other.end_time()
-        self.polylines.extend(other.polylines)
-        self._length_meters += other.length_meters
-        self.file_names.extend(other.file_names)
-        self.special = self.special or other.special
+        """Append other track to self (see concatenate, which merges several tracks at once)."""
+        self.__dict__.update(Track.concatenate([self, other]).__dict__)
+
+
+def track_key(track: Track) -> str:
+    """Identify a (merged) track by the files it was loaded from, e.g. to find it again after reloading."""
+    return "|".join(track.file_names)
+
+
+def track_fingerprint(track: Track) -> str:
+    """Summarize a track, so that a changed track (with the same key) has a different fingerprint."""
+    return (
+        f"{track.start_time().isoformat()}/{track.end_time().isoformat()}/{len(track.lats)}/{track.length_meters:.3f}"
+    )
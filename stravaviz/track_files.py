@@ -0,0 +1,109 @@
+import contextlib
+import functools
+import gzip
+import os
+import typing
+import zipfile
+
+from stravaviz.exceptions import ParameterError
+
+# Supported activity files; ".gz" files are decompressed while they are read.
+SUFFIXES = (".gpx", ".gpx.gz", ".fit", ".fit.gz")
+
+Stamp = typing.Tuple[int, int]
+
+
+def is_track_file(name: str) -> bool:
+    return name.lower().endswith(SUFFIXES)
+
+
+def track_file_format(name: str) -> str:
+    """Return the format ("gpx" or "fit") of an activity file by its name."""
+    name = name.lower()
+    if name.endswith(".gz"):
+        name = name[: -len(".gz")]
+    return "fit" if name.endswith(".fit") else "gpx"
+
+
+def file_stamp(file_name: str) -> Stamp:
+    """Return modification time (ns) and size of the file; a cached track is valid only for the same stamp."""
+    st = os.stat(file_name)
+    return st.st_mtime_ns, st.st_size
+
+
+def list_track_files(path: str) -> typing.Dict[str, Stamp]:
+    """Return the activity files in a directory or a zip archive (e.g. a Strava bulk export) with their stamps.
+
+    Files in a zip archive are named like the archive followed by their path within it
+    ("export.zip/activities/123.fit.gz"); their stamp is the checksum and size of the member. Files that
+    vanish while listing are skipped.
+
+    Raises:
+        ParameterError: path is neither a directory nor a zip archive.
+    """
+    path = os.path.abspath(path)
+    if os.path.isfile(path) and zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            return {
+                os.path.join(path, info.filename): (info.CRC, info.file_size)
+                for info in archive.infolist()
+                if not info.is_dir() and is_track_file(info.filename)
+            }
+    if not os.path.isdir(path):
+        raise ParameterError(f"Not a directory or zip archive: {path}")
+    stamps = {}
+    for name in os.listdir(path):
+        path_name = os.path.join(path, name)
+        if not is_track_file(name) or not os.path.isfile(path_name):
+            continue
+        try:
+            stamps[path_name] = file_stamp(path_name)
+        except FileNotFoundError:
+            continue
+    return stamps
+
+
+@contextlib.contextmanager
+def open_track_file(file_name: str) -> typing.Iterator[typing.BinaryIO]:
+    """Open an activity file (see list_track_files) for reading bytes, decompressing ".gz" files on the fly.
+
+    Nothing is extracted to disk; files in zip archives and compressed files are decompressed while read.
+    """
+    with contextlib.ExitStack() as stack:
+        archive_name, member = _split_archive_path(file_name)
+        if archive_name is None:
+            file: typing.BinaryIO = stack.enter_context(open(file_name, "rb"))
+        else:
+            archive = _open_archive(archive_name, file_stamp(archive_name))
+            file = typing.cast(typing.BinaryIO, stack.enter_context(archive.open(member)))
+        yield stack.enter_context(decompress(file, file_name))
+
+
+@contextlib.contextmanager
+def decompress(file: typing.BinaryIO, file_name: str) -> typing.Iterator[typing.BinaryIO]:
+    """Decompress a file object on the fly if its name ends with ".gz", else return it as is."""
+    if not file_name.lower().endswith(".gz"):
+        yield file
+        return
+    with gzip.GzipFile(fileobj=file, mode="rb") as gzip_file:
+        yield typing.cast(typing.BinaryIO, gzip_file)
+
+
+def _split_archive_path(file_name: str) -> typing.Tuple[typing.Optional[str], str]:
+    """Split "export.zip/activities/1.gpx" into the archive and the member name; (None, file_name) for files."""
+    if os.path.isfile(file_name):
+        return None, file_name
+    head, tail = file_name, ""
+    while head and head != os.path.dirname(head):
+        head, name = os.path.split(head)
+        tail = f"{name}/{tail}" if tail else name
+        if os.path.isfile(head):
+            return head, tail
+    return None, file_name
+
+
+@functools.lru_cache(maxsize=4)
+def _open_archive(archive_name: str, stamp: Stamp) -> zipfile.ZipFile:  # pylint: disable=unused-argument
+    # archives are kept open (per process), so the directory of a large archive is read only once; the stamp
+    # is part of the key, so a replaced archive is opened again
+    return zipfile.ZipFile(archive_name)
@@ -1,126 +1,374 @@
 import concurrent.futures
+import datetime
+import hashlib
+import itertools
 import logging
 import os
+import time
 import typing
+import xml.etree.ElementTree as ET
+import zipfile
+import zlib
 
-import pint  # type: ignore
-import s2sphere  # type: ignore
-from stravaviz.units import Units
-
-from stravaviz.exceptions import ParameterError, TrackLoadError
-from stravaviz.track import Track
+from stravaviz import defaults, fit_reader, gpx_reader, profiling, track_files
+from stravaviz.exceptions import TrackLoadError
+from stravaviz.track import DEFAULT_SIMPLIFY_TOLERANCE, Track
 from stravaviz.year_range import YearRange
 
+if typing.TYPE_CHECKING:
+    import pint  # type: ignore
+
 log = logging.getLogger(__name__)
 
+# Number of batches of files submitted to each worker process ahead of time; bounds the number of parsed tracks
+# waiting to be picked up.
+PENDING_PER_WORKER = 2
+DEFAULT_MERGE_GAP = defaults.MERGE_GAP
+# Largest number of files parsed by a worker process as one task, unless set explicitly.
+MAX_BATCH_SIZE = 32
+
 
-def load_gpx_file(file_name: str) -> Track:
-    """Load an individual GPX file as a track by using Track.load_gpx()"""
+def load_track_file(
+    file_name: str, parser: str = "gpxpy", simplify_tolerance: float = DEFAULT_SIMPLIFY_TOLERANCE
+) -> Track:
+    """Load an individual activity file as a track by using Track.load_file()"""
     log.info("Loading track %s...", os.path.basename(file_name))
     t = Track()
-    t.load_gpx(file_name)
+    t.load_file(file_name, parser, simplify_tolerance)
+    return t
+
+
+def load_track_file_batch(
+    file_names: typing.List[str], parser: str, simplify_tolerance: float, profile: bool = False
+) -> typing.Tuple[
+    typing.List[typing.Tuple[str, typing.Union[typing.Dict[str, typing.Any], str]]],
+    bytearray,
+    typing.Dict[str, typing.Dict[str, float]],
+]:
+    """Load a batch of activity files (in a worker process) and pack all tracks into one buffer (see Track.pack).
+
+    Returns:
+        Metadata of the track (with its "buffer_offset" and "parse_seconds") or the error message for each file,
+        the buffer, and the times of the stages of loading (see profiling.Profiler.stages) if profile is set.
+    """
+    # stages of the worker process are timed by a profiler of its own, one per batch
+    profiler = profiling.enable() if profile else None
+    results: typing.List[typing.Tuple[str, typing.Union[typing.Dict[str, typing.Any], str]]] = []
+    buffer = bytearray()
+    for file_name in file_names:
+        start = time.perf_counter()
+        try:
+            metadata, data = load_track_file(file_name, parser, simplify_tolerance).pack()
+        except TrackLoadError as e:
+            results.append((file_name, str(e)))
+            continue
+        metadata["parse_seconds"] = time.perf_counter() - start
+        metadata["buffer_offset"] = len(buffer)
+        buffer += data
+        results.append((file_name, metadata))
+    return results, buffer, profiler.stages if profiler is not None else {}
+
+
+def load_cached_track_file(
+    cache_file_name: str, file_name: str, stamp: typing.Tuple[int, int], simplify_tolerance: float
+) -> Track:
+    """Load an individual track from cache files"""
+    t = Track()
+    t.load_cache(cache_file_name, stamp, simplify_tolerance)
+    t.file_names = [os.path.basename(file_name)]
     return t
 
 
 class TrackLoader:
-    """Handle the loading of tracks from cache and/or GPX files
+    """Handle the loading of tracks from cache and/or activity (GPX or FIT) files
 
     Attributes:
-        min_length: All tracks shorter than this value are filtered out.
+        min_length: All tracks shorter than this many meters are filtered out.
         special_file_names: Tracks marked as special in command line args
         year_range: All tracks outside of this range will be filtered out.
+        cache_dir: Directory used to store parsed tracks; caching is disabled if None.
+        parser: GPX parser passed to Track.load_file ("gpxpy" or "fast").
+        simplify_tolerance: Simplification tolerance (meters) passed to Track.load_file.
+        jobs: Number of worker processes parsing activity files; 1 parses them in this process.
+        batch_size: Number of activity files a worker parses per task (automatic if None).
+        merge_gap: Tracks starting less than this many seconds after the end of the previous ones are merged.
 
     Methods:
-        load_tracks: Load all data from cache and GPX files
+        load_tracks: Load all data from cache and activity files
+        list_track_files: Return the activity files of a directory or zip archive with their stamps.
+        load_track_files: Load the given activity files from cache or by parsing them.
+        filter_and_merge_tracks: Filter tracks and merge tracks recorded shortly after each other.
+
+    See TrackSet for keeping the tracks of a directory up to date.
     """
 
     def __init__(self) -> None:
-        self._min_length: pint.quantity.Quantity = 1 * Units().km
+        self.min_length = defaults.MIN_LENGTH
         self.special_file_names: typing.List[str] = []
         self.year_range = YearRange()
+        self.cache_dir: typing.Optional[str] = None
+        self.parser = "gpxpy"
+        self.simplify_tolerance = DEFAULT_SIMPLIFY_TOLERANCE
+        self.jobs = os.cpu_count() or 1
+        self.batch_size: typing.Optional[int] = None
+        self.merge_gap = DEFAULT_MERGE_GAP
 
-    def set_min_length(self, min_length: pint.quantity.Quantity) -> None:
-        self._min_length = min_length
+    def set_min_length(self, min_length: typing.Union[float, "pint.Quantity"]) -> None:
+        """Set min_length, given in meters or as pint quantity (e.g. 1 * Units().km)."""
+        self.min_length = min_length.m_as("meter") if hasattr(min_length, "m_as") else float(min_length)
 
     def load_tracks(self, base_dir: str) -> typing.List[Track]:
         """Load tracks base_dir and return as a List of tracks"""
-        file_names = list(self._list_gpx_files(base_dir))
-        log.info("GPX files: %d", len(file_names))
+        stamps = self.list_track_files(base_dir)
+        return self.filter_and_merge_tracks(list(self.load_track_files(stamps).values()))
+
+    def list_track_files(self, base_dir: str) -> typing.Dict[str, track_files.Stamp]:
+        """Return the activity files in base_dir (a directory or zip archive) with their stamps.
+
+        See track_files.list_track_files.
+        """
+        with profiling.stage("list"):
+            stamps = track_files.list_track_files(base_dir)
+        log.info("Activity files: %d", len(stamps))
+        return stamps
 
-        tracks: typing.List[Track] = []
+    def load_track_files(self, stamps: typing.Dict[str, typing.Tuple[int, int]]) -> typing.Dict[str, Track]:
+        """Load the given activity files (with their stamps), from cache if possible, and cache newly parsed ones.
 
-        log.info("Trying to load %d track(s) from GPX files; this may take a while...", len(file_names))
-        loaded_tracks = self._load_tracks(file_names)
-        tracks.extend(loaded_tracks.values())
-        log.info("Conventionally loaded tracks: %d", len(loaded_tracks))
+        Tracks are filtered (see filter_and_merge_tracks) as soon as they are loaded, so tracks that are dropped
+        are never kept. With a year range, activity files whose first track point is outside of it are not parsed
+        at all. Files are parsed by a pool of worker processes with a bounded number of files in flight.
 
-        return self._filter_and_merge_tracks(tracks)
+        Returns:
+            Loaded tracks that passed the filters by file name; files that failed to load are logged and left out.
+        """
+        tracks: typing.Dict[str, Track] = {}
+        remaining_file_names = list(stamps)
+        if self.cache_dir:
+            log.info("Trying to load %d track(s) from cache...", len(stamps))
+            remaining_file_names = []
+            cached = 0
+            with profiling.stage("load cache"):
+                for file_name, stamp in stamps.items():
+                    t = self._load_track_from_cache(file_name, stamp)
+                    if t is None:
+                        remaining_file_names.append(file_name)
+                        continue
+                    cached += 1
+                    if self._filter_track(t):
+                        tracks[file_name] = t
+            log.info("Loaded tracks from cache: %d", cached)
+            profiling.count("files loaded from cache", cached)
+
+        if self.year_range.from_year is not None:
+            with profiling.stage("check years"):
+                checked = len(remaining_file_names)
+                remaining_file_names = [f for f in remaining_file_names if self._may_be_in_year_range(f)]
+            profiling.count("files skipped by year", checked - len(remaining_file_names))
+        if remaining_file_names:
+            log.info(
+                "Trying to load %d track(s) from activity files; this may take a while...", len(remaining_file_names)
+            )
+            loaded = 0
+            with profiling.stage("parse"):
+                for file_name, t, seconds in self._parse_tracks(remaining_file_names):
+                    loaded += 1
+                    profiling.add_file(file_name, seconds)
+                    profiling.count("points before simplification", t.raw_points)
+                    profiling.count("points after simplification", len(t.lats))
+                    with profiling.stage("store cache"):
+                        self._store_track_to_cache(file_name, t, stamps[file_name])
+                    if self._filter_track(t):
+                        tracks[file_name] = t
+            log.info("Conventionally loaded tracks: %d", loaded)
+            profiling.count("files parsed", loaded)
+            profiling.count("files failed", len(remaining_file_names) - loaded)
+
+        return tracks
+
+    def _filter_track(self, t: Track) -> bool:
+        file_name = t.file_names[0]
+        if t.length_meters == 0:
+            log.info("%s: skipping empty track", file_name)
+        elif not t.has_time():
+            log.info("%s: skipping track without start or end time", file_name)
+        elif not self.year_range.contains(t.start_time()):
+            log.info("%s: skipping track with wrong year %d", file_name, t.start_time().year)
+        elif len(t.elevations) == 0:
+            log.info("%s: skipping track without elevations", file_name)
+        else:
+            t.special = file_name in self.special_file_names
+            return True
+        return False
 
     def _filter_tracks(self, tracks: typing.List[Track]) -> typing.List[Track]:
-        filtered_tracks = []
-        for t in tracks:
-            file_name = t.file_names[0]
-            if t.length().magnitude == 0:
-                log.info("%s: skipping empty track", file_name)
-            elif not t.has_time():
-                log.info("%s: skipping track without start or end time", file_name)
-            elif not self.year_range.contains(t.start_time()):
-                log.info("%s: skipping track with wrong year %d", file_name, t.start_time().year)
-            elif len(t.elevations) == 0:
-                log.info("%s: skipping track without elevations", file_name)
-            else:
-                t.special = file_name in self.special_file_names
-                filtered_tracks.append(t)
-        return filtered_tracks
-
-    def _filter_and_merge_tracks(self, tracks: typing.List[Track]) -> typing.List[Track]:
-        tracks = self._filter_tracks(tracks)
-        # merge tracks that took place within one hour
-        tracks = self._merge_tracks(tracks)
-        # filter out tracks with length < min_length
-        return [t for t in tracks if t.length() >= self._min_length]
-
-    @staticmethod
-    def _merge_tracks(tracks: typing.List[Track]) -> typing.List[Track]:
+        return [t for t in tracks if self._filter_track(t)]
+
+    def _may_be_in_year_range(self, file_name: str) -> bool:
+        """Check the year of the first track point, without parsing the whole file."""
+        if self.year_range.from_year is None:
+            return True
+        try:
+            with track_files.open_track_file(file_name) as f:
+                if track_files.track_file_format(file_name) == "fit":
+                    start_time = fit_reader.read_start_time(f)
+                else:
+                    start_time = gpx_reader.read_start_time(f)
+        except (OSError, EOFError, zlib.error, zipfile.BadZipFile, ET.ParseError, TrackLoadError):
+            # let the parser report the problem
+            return True
+        if start_time is not None and not self.year_range.contains(start_time):
+            log.info("%s: skipping track with wrong year %d", os.path.basename(file_name), start_time.year)
+            return False
+        return True
+
+    def filter_and_merge_tracks(self, tracks: typing.List[Track]) -> typing.List[Track]:
+        """Filter tracks (year range, length, ...) and merge tracks recorded within merge_gap of each other.
+
+        The given tracks are not modified, so they can be filtered and merged again later (e.g. after adding
+        more tracks).
+        """
+        with profiling.stage("filter and merge"):
+            tracks = self._filter_tracks(tracks)
+            # merge tracks that belong to the same activity
+            tracks = self._merge_tracks(tracks)
+            # filter out tracks with length < min_length
+            tracks = [t for t in tracks if t.length_meters >= self.min_length]
+        profiling.count("tracks", len(tracks))
+        return tracks
+
+    def _merge_tracks(self, tracks: typing.List[Track]) -> typing.List[Track]:
+        """Merge tracks whose time spans overlap or are less than merge_gap apart, in one sweep by start time."""
         log.info("Merging tracks...")
         tracks = sorted(tracks, key=lambda t1: t1.start_time())
-        merged_tracks = []
-        last_end_time = None
+        groups: typing.List[typing.List[Track]] = []
+        group_end: typing.Optional[datetime.datetime] = None
         for t in tracks:
-            if last_end_time is None:
-                merged_tracks.append(t)
+            if group_end is None or (t.start_time() - group_end).total_seconds() >= self.merge_gap:
+                groups.append([t])
+                group_end = t.end_time()
             else:
-                dt = (t.start_time() - last_end_time).total_seconds()
-                if 0 < dt < 3600:
-                    merged_tracks[-1].append(t)
-                else:
-                    merged_tracks.append(t)
-            last_end_time = t.end_time()
+                groups[-1].append(t)
+                group_end = max(group_end, t.end_time())
+        merged_tracks = [group[0] if len(group) == 1 else Track.concatenate(group) for group in groups]
         log.info("Merged %d track(s)", len(tracks) - len(merged_tracks))
         return merged_tracks
 
-    @staticmethod
-    def _load_tracks(file_names: typing.List[str]) -> typing.Dict[str, Track]:
-        tracks = {}
-        with concurrent.futures.ProcessPoolExecutor() as executor:
-            future_to_file_name = {executor.submit(load_gpx_file, file_name): file_name for file_name in file_names}
-        for future in concurrent.futures.as_completed(future_to_file_name):
-            file_name = future_to_file_name[future]
-            try:
-                t = future.result()
-            except TrackLoadError as e:
-                log.error("Error while loading %s: %s", file_name, str(e))
-            else:
-                tracks[file_name] = t
+    def _parse_tracks(self, file_names: typing.List[str]) -> typing.Iterator[typing.Tuple[str, Track, float]]:
+        """Parse activity files, yielding (file name, track, seconds it took) as soon as each file is parsed.
 
-        return tracks
+        With more than one job (and file), batches of files are parsed by worker processes, which send the tracks
+        back as raw buffers rather than pickled objects. Only PENDING_PER_WORKER batches per worker are submitted
+        ahead, so parsed tracks never pile up. A single file (e.g. a changed file while watching) is parsed in this
+        process, without starting workers.
+        """
+        jobs = min(self.jobs, len(file_names))
+        if jobs <= 1:
+            for file_name in file_names:
+                start = time.perf_counter()
+                try:
+                    t = load_track_file(file_name, self.parser, self.simplify_tolerance)
+                    yield file_name, t, time.perf_counter() - start
+                except TrackLoadError as e:
+                    log.error("Error while loading %s: %s", file_name, str(e))
+            return
+
+        max_pending = jobs * PENDING_PER_WORKER
+        batch_size = self.batch_size or min(max(-(-len(file_names) // max_pending), 1), MAX_BATCH_SIZE)
+        file_names_iter = iter(file_names)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            pending: typing.Set[concurrent.futures.Future] = set()
+            while True:
+                while len(pending) < max_pending:
+                    batch = list(itertools.islice(file_names_iter, batch_size))
+                    if not batch:
+                        break
+                    pending.add(
+                        executor.submit(
+                            load_track_file_batch, batch, self.parser, self.simplify_tolerance, profiling.enabled()
+                        )
+                    )
+                if not pending:
+                    break
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    results, buffer, stages = future.result()
+                    profiling.add_stages(stages)
+                    for file_name, result in results:
+                        if isinstance(result, str):
+                            log.error("Error while loading %s: %s", file_name, result)
+                        else:
+                            t = Track.unpack(result, buffer, result["buffer_offset"])
+                            yield file_name, t, result["parse_seconds"]
+
+    def _load_track_from_cache(self, file_name: str, stamp: typing.Tuple[int, int]) -> typing.Optional[Track]:
+        try:
+            return load_cached_track_file(
+                self._get_cache_file_name(file_name), file_name, stamp, self.simplify_tolerance
+            )
+        except TrackLoadError as e:
+            log.debug("Not using cache for %s: %s", file_name, str(e))
+            return None
+
+    def _store_track_to_cache(self, file_name: str, t: Track, stamp: typing.Tuple[int, int]) -> None:
+        if not self.cache_dir:
+            return
+        try:
+            t.store_cache(self._get_cache_file_name(file_name), stamp)
+        except OSError as e:
+            log.error("Failed to store track %s to cache: %s", file_name, str(e))
+
+    def _get_cache_file_name(self, file_name: str) -> str:
+        assert self.cache_dir
+        key = hashlib.sha256(os.path.abspath(file_name).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+
+class TrackSet:
+    """Tracks of a directory or zip archive of activity files, kept in memory and updated incrementally.
+
+    The activity files are listed again on each update; only added and changed files (see track_files.Stamp) are
+    loaded (through the cache of the loader), and tracks of deleted files are dropped. All tracks are then
+    filtered and merged again, which is cheap compared to parsing.
+
+    Attributes:
+        loader: Loader used to list, load, filter and merge tracks.
+        path: Directory or zip archive of the activity files.
+        tracks: Filtered and merged tracks, replaced (not modified) by updates.
+        version: Digest of the names and stamps of the activity files the tracks were loaded from.
+
+    Methods:
+        update: Load added and changed activity files and drop deleted ones.
+    """
+
+    def __init__(self, loader: TrackLoader, path: str) -> None:
+        self.loader = loader
+        self.path = path
+        self.tracks: typing.List[Track] = []
+        self.version = ""
+        self._stamps: typing.Dict[str, track_files.Stamp] = {}
+        self._file_tracks: typing.Dict[str, Track] = {}
+
+    def update(self) -> bool:
+        """Load added and changed activity files and drop deleted ones.
 
-    @staticmethod
-    def _list_gpx_files(base_dir: str) -> typing.Generator[str, None, None]:
-        base_dir = os.path.abspath(base_dir)
-        if not os.path.isdir(base_dir):
-            raise ParameterError(f"Not a directory: {base_dir}")
-        for name in os.listdir(base_dir):
-            path_name = os.path.join(base_dir, name)
-            if name.endswith(".gpx") and os.path.isfile(path_name):
-                yield path_name
+        Returns:
+            Whether any activity file was added, changed or deleted since the last update.
+        """
+        stamps = self.loader.list_track_files(self.path)
+        changed = {file_name: stamp for file_name, stamp in stamps.items() if self._stamps.get(file_name) != stamp}
+        deleted = [file_name for file_name in self._stamps if file_name not in stamps]
+        if not changed and not deleted:
+            return False
+        log.info("%d activity file(s) added or changed, %d deleted", len(changed), len(deleted))
+        for file_name in deleted + list(changed):
+            self._file_tracks.pop(file_name, None)
+        # files that fail to load are not retried until they change again
+        self._file_tracks.update(self.loader.load_track_files(changed))
+        self._stamps = stamps
+        self.tracks = self.loader.filter_and_merge_tracks(list(self._file_tracks.values()))
+        digest = hashlib.sha256()
+        for file_name, stamp in sorted(stamps.items()):
+            digest.update(f"{file_name}\0{stamp[0]}\0{stamp[1]}\n".encode("utf-8"))
+        self.version = digest.hexdigest()[:16]
+        return True
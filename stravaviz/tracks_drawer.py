@@ -1,18 +1,31 @@
-import argparse
 import typing
 
-import pint  # type: ignore
-import svgwrite  # type: ignore
-
+from stravaviz.artifacts import SharedArtifacts
+from stravaviz.options import RenderOptions
+from stravaviz.svg_writer import SvgWriter
 from stravaviz.track import Track
 from stravaviz.xy import XY
 
 
 class TracksDrawer:
-    """Base class that other drawer classes inherit from."""
+    """Base class that other drawer classes inherit from.
+
+    Attributes:
+        tracks: Tracks to draw.
+        options: Options of the image (defaults if not given); checked when the drawer is created.
+        artifacts: Data derived from the tracks, shared with other drawers (computed if not given).
+    """
 
-    def __init__(self, tracks: typing.List[Track], _: argparse.Namespace):
+    def __init__(
+        self,
+        tracks: typing.List[Track],
+        options: typing.Optional[RenderOptions] = None,
+        artifacts: typing.Optional[SharedArtifacts] = None,
+    ):
         self.tracks = tracks
+        self.options = options if options is not None else RenderOptions()
+        self.options.validate()
+        self.artifacts = artifacts if artifacts is not None else SharedArtifacts(tracks)
 
-    def draw(self, dr: svgwrite.Drawing, g: svgwrite.container.Group, size: XY, offset: XY) -> None:
+    def draw(self, svg: SvgWriter, size: XY, offset: XY) -> None:
         pass
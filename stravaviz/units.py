@@ -4,7 +4,7 @@ import pint  # type: ignore
 
 
 class Units:
-    _instance = None
+    _instance: typing.Optional[pint.UnitRegistry] = None
 
     def __init__(self) -> None:
         if not Units._instance:
@@ -1,11 +1,18 @@
 import math
 import typing
 
-import colour  # type: ignore
+import numpy as np
 import s2sphere  # type: ignore
 
+from stravaviz import profiling
 from stravaviz.xy import XY
 
+# the same constants gpxpy uses for distances
+EARTH_RADIUS = 6378.137 * 1000
+ONE_DEGREE = (2 * math.pi * EARTH_RADIUS) / 360
+# deviation (in output units, i.e. mm) small enough to go unnoticed next to 0.5mm wide strokes
+INVISIBLE_DEVIATION = 0.1
+
 
 # mercator projection
 def latlng2xy(latlng: s2sphere.LatLng) -> XY:
@@ -23,6 +30,80 @@ def lat2y(lat_deg: float) -> float:
 def project(
     bbox: s2sphere.LatLngRect, size: XY, offset: XY, latlnglines: typing.List[typing.List[s2sphere.LatLng]]
 ) -> typing.List[typing.List[typing.Tuple[float, float]]]:
+    lats = np.array([latlng.lat().degrees for line in latlnglines for latlng in line], dtype=np.float64)
+    lngs = np.array([latlng.lng().degrees for line in latlnglines for latlng in line], dtype=np.float64)
+    offsets = np.zeros(len(latlnglines) + 1, dtype=np.int64)
+    np.cumsum([len(line) for line in latlnglines], out=offsets[1:])
+    lines = project_segments(bbox, size, offset, lats, lngs, offsets)
+    return [[tuple(point) for point in line.tolist()] for line in lines]
+
+
+def project_segments(
+    bbox: s2sphere.LatLngRect, size: XY, offset: XY, lats: np.ndarray, lngs: np.ndarray, offsets: np.ndarray
+) -> typing.List[np.ndarray]:
+    """Project segments given as coordinate arrays (see Track) into the size x offset box.
+
+    Points outside of bbox are dropped and the segments are split at them, the result is a list
+    of (n, 2) arrays of x, y coordinates.
+    """
+    with profiling.stage("project"):
+        return _project_segments(bbox, size, offset, lats, lngs, offsets)
+
+
+def _project_segments(
+    bbox: s2sphere.LatLngRect, size: XY, offset: XY, lats: np.ndarray, lngs: np.ndarray, offsets: np.ndarray
+) -> typing.List[np.ndarray]:
+    if len(lats) == 0:
+        return []
+    scale, offset = _projection(bbox, size, offset)
+
+    inside = np.flatnonzero(_contains(bbox, lats, lngs))
+    if len(inside) == 0:
+        return []
+    xy = np.empty((len(inside), 2), dtype=np.float64)
+    xy[:, 0] = offset.x + scale * lng2x_array(lngs[inside])
+    xy[:, 1] = offset.y + scale * lat2y_array(lats[inside])
+
+    # a line continues only with the immediately following point of the same segment
+    segment_starts = np.zeros(len(lats), dtype=bool)
+    segment_starts[offsets[:-1][offsets[:-1] < len(lats)]] = True
+    breaks = np.flatnonzero((np.diff(inside) != 1) | segment_starts[inside[1:]]) + 1
+    return np.split(xy, breaks)
+
+
+def max_deviation_meters(bbox: s2sphere.LatLngRect, size: XY) -> float:
+    """Largest simplification error (meters) that stays invisible when bbox is projected into size.
+
+    Mercator is conformal, so the scale only depends on the latitude; the latitude farthest from the equator
+    has the most output units per meter and determines the result.
+    """
+    scale, _ = _projection(bbox, size, XY())
+    max_lat = min(max(abs(bbox.lat_lo().degrees), abs(bbox.lat_hi().degrees)), 89.0)
+    meters_per_unit = 180 * ONE_DEGREE * math.cos(math.radians(max_lat)) / scale
+    return INVISIBLE_DEVIATION * meters_per_unit
+
+
+def select_segments(
+    lats: np.ndarray, lngs: np.ndarray, offsets: np.ndarray, segments: np.ndarray
+) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return lats, lngs and offsets (see Track) of only the given segments."""
+    starts = offsets[segments]
+    sizes = offsets[segments + 1] - starts
+    new_offsets = np.zeros(len(segments) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=new_offsets[1:])
+    indices = np.repeat(starts - new_offsets[:-1], sizes) + np.arange(new_offsets[-1])
+    return lats[indices], lngs[indices], new_offsets
+
+
+def lng2x_array(lngs_deg: np.ndarray) -> np.ndarray:
+    return lngs_deg / 180 + 1
+
+
+def lat2y_array(lats_deg: np.ndarray) -> np.ndarray:
+    return 0.5 - np.log(np.tan(math.pi / 4 * (1 + lats_deg / 90))) / math.pi
+
+
+def _projection(bbox: s2sphere.LatLngRect, size: XY, offset: XY) -> typing.Tuple[float, XY]:
     min_x = lng2x(bbox.lng_lo().degrees)
     d_x = lng2x(bbox.lng_hi().degrees) - min_x
     while d_x >= 2:
@@ -34,33 +115,73 @@ def project(
     d_y = abs(max_y - min_y)
 
     scale = size.x / d_x if size.x / size.y <= d_x / d_y else size.y / d_y
-    offset = offset + 0.5 * (size - scale * XY(d_x, -d_y)) - scale * XY(min_x, min_y)
-    lines = []
-    for latlngline in latlnglines:
-        line = []
-        for latlng in latlngline:
-            if bbox.contains(latlng):
-                line.append((offset + scale * latlng2xy(latlng)).tuple())
-            else:
-                if len(line) > 0:
-                    lines.append(line)
-                    line = []
-        if len(line) > 0:
-            lines.append(line)
-    return lines
+    return scale, offset + 0.5 * (size - scale * XY(d_x, -d_y)) - scale * XY(min_x, min_y)
+
+
+def _contains(bbox: s2sphere.LatLngRect, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Vectorized s2sphere.LatLngRect.contains for points given in degrees."""
+    lat_rad = np.radians(lats)
+    lng_rad = np.radians(lngs)
+    lng_rad[lng_rad == -math.pi] = math.pi
+    lat, lng = bbox.lat(), bbox.lng()
+    mask = (lat_rad >= lat.lo()) & (lat_rad <= lat.hi())
+    if lng.is_inverted():
+        if lng.is_empty():
+            return np.zeros(len(lats), dtype=bool)
+        return mask & ((lng_rad >= lng.lo()) | (lng_rad <= lng.hi()))
+    return mask & (lng_rad >= lng.lo()) & (lng_rad <= lng.hi())
+
+
+def distances_2d(lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Distances (meters) between consecutive points, computed the same way as gpxpy's length_2d.
+
+    Close points use gpxpy's flat approximation, points more than 0.2 degrees apart use the haversine formula.
+    """
+    lat1, lng1 = lats[1:], lngs[1:]
+    lat2, lng2 = lats[:-1], lngs[:-1]
+    x = lat1 - lat2
+    y = (lng1 - lng2) * np.cos(np.radians(lat1))
+    distances = np.sqrt(x * x + y * y) * ONE_DEGREE
+    far = (np.abs(lat1 - lat2) > 0.2) | (np.abs(lng1 - lng2) > 0.2)
+    if far.any():
+        r_lat1, r_lat2 = np.radians(lat1[far]), np.radians(lat2[far])
+        a = np.sin((r_lat1 - r_lat2) / 2) ** 2 + np.sin(np.radians(lng1[far] - lng2[far]) / 2) ** 2 * np.cos(
+            r_lat1
+        ) * np.cos(r_lat2)
+        distances[far] = 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+    return distances
+
+
+def cumulative_distances(lats: np.ndarray, lngs: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Distance (meters, see distances_2d) along the segments (see Track) from the first point to each point.
+
+    Gaps between segments don't count, so the last distance is the length of the track.
+    """
+    steps = np.zeros(len(lats), dtype=np.float64)
+    if len(lats) > 1:
+        steps[1:] = distances_2d(lats, lngs)
+        starts = offsets[1:-1]
+        steps[starts[starts < len(lats)]] = 0
+    return np.cumsum(steps)
 
 
 def compute_grid(
     count: int, dimensions: XY
 ) -> typing.Tuple[typing.Optional[float], typing.Optional[typing.Tuple[int, int]]]:
-    # this is somehow suboptimal O(count^2). I guess it's possible in O(count)
+    # For a fixed count_x, the waste only grows with count_y, so the smallest count_y that fits all cells is the
+    # only candidate worth checking. Consecutive count_x sharing that smallest count_y only get smaller cells, so
+    # just the first of them is checked, which makes this O(sqrt(count)). Rounding can make the waste of the best
+    # candidate slightly negative; such candidates are skipped exactly as an exhaustive search would skip them.
     min_waste = -1.0
     best_size = None
     best_counts = None
-    for count_x in range(1, count + 1):
-        size_x = dimensions.x / count_x
-        for count_y in range(1, count + 1):
-            if count_x * count_y >= count:
+    count_x = 1
+    while count_x <= count:
+        min_count_y = -(-count // count_x)
+        next_count_x = -(-count // (min_count_y - 1)) if min_count_y > 1 else count + 1
+        for block_count_x in range(count_x, next_count_x):
+            size_x = dimensions.x / block_count_x
+            for count_y in range(min_count_y, count + 1):
                 size_y = dimensions.y / count_y
                 size = min(size_x, size_y)
                 waste = dimensions.x * dimensions.y - count * size * size
@@ -68,6 +189,10 @@ def compute_grid(
                     continue
                 if best_size is None or waste < min_waste:
                     best_size = size
-                    best_counts = count_x, count_y
+                    best_counts = block_count_x, count_y
                     min_waste = waste
+                break
+            if waste >= 0 and count_y == min_count_y:
+                break
+        count_x = next_count_x
     return best_size, best_counts
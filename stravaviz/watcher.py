@@ -0,0 +1,137 @@
+import logging
+import time
+import typing
+from pathlib import Path
+
+from stravaviz import defaults, render_pipeline, spatial_index
+from stravaviz.drawer import Drawer
+from stravaviz.heatmap_drawer import HeatmapDrawer
+from stravaviz.options import RenderOptions
+from stravaviz.tiles import TileRenderer
+from stravaviz.track import Track, track_fingerprint, track_key
+from stravaviz.track_loader import TrackLoader, TrackSet
+
+log = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = defaults.WATCH_INTERVAL
+
+
+class Watcher:
+    """Keep the images in the output directory up to date with a directory of GPX files.
+
+    The directory is polled for added, changed (modification time or size) and deleted GPX files, and only
+    those are loaded (see TrackSet). Then only the outputs affected by the changed (merged) tracks are
+    rendered again: the facets and elevations whenever the set of tracks changes (they show all tracks in a
+    grid and on a common scale), the heatmap only if a changed track intersects its region (if the region is
+    fixed), and map tiles only where changed tracks are (see TileRenderer). If no tracks are left, the images
+    are removed.
+
+    Attributes:
+        loader: Loader used to list, load, filter and merge tracks.
+        drawer: Drawer with the image settings.
+        gpx_dir: Directory or zip archive of the activity files.
+        output_dir: Directory the images are written to.
+        options: Options of the images.
+        outputs: Names of the outputs to keep up to date (see render_pipeline.OUTPUTS).
+        tiles: Range of zoom levels of map tiles to keep up to date, if any.
+
+    Methods:
+        update: Check for changes once and render the outputs they affect.
+        run: Update periodically until interrupted.
+    """
+
+    def __init__(
+        self,
+        loader: TrackLoader,
+        drawer: Drawer,
+        gpx_dir: str,
+        output_dir: str,
+        options: RenderOptions,
+        outputs: typing.List[str],
+        *,
+        tiles: typing.Optional[typing.Tuple[int, int]] = None,
+    ):
+        self.loader = loader
+        self.drawer = drawer
+        self.gpx_dir = gpx_dir
+        self.output_dir = output_dir
+        self.options = options
+        self.outputs = outputs
+        self.tiles = tiles
+        self._track_set = TrackSet(loader, gpx_dir)
+        self._merged_tracks: typing.Dict[str, Track] = {}
+        self._rendered = False
+        region = HeatmapDrawer([], options).region() if "heatmap" in outputs else None
+        self._heatmap_region = spatial_index.rect_from_latlngrect(region) if region is not None else None
+
+    def update(self) -> typing.List[str]:
+        """Load added and changed GPX files, drop deleted ones, and render the outputs affected by the changes.
+
+        Returns:
+            Names of the rendered (or removed) outputs ("tiles" for map tiles).
+        """
+        if not self._track_set.update() and self._rendered:
+            return []
+        tracks = self._track_set.tracks
+        merged_tracks = {track_key(tr): tr for tr in tracks}
+        previous = self._merged_tracks
+        self._merged_tracks = merged_tracks
+        affected = [
+            tr
+            for key, tr in merged_tracks.items()
+            if key not in previous or track_fingerprint(previous[key]) != track_fingerprint(tr)
+        ] + [
+            tr
+            for key, tr in previous.items()
+            if key not in merged_tracks or track_fingerprint(merged_tracks[key]) != track_fingerprint(tr)
+        ]
+        if self._rendered and not affected:
+            return []
+        self._rendered = True
+        if not tracks:
+            return self._remove_outputs()
+
+        # after the images were removed (or before the first rendering), all of them are rendered
+        outputs = self._affected_outputs(affected) if previous else self.outputs
+        self.drawer.set_tracks(tracks)
+        Path(self.output_dir).mkdir(parents=True, exist_ok=True)
+        pipeline = render_pipeline.RenderPipeline(self.drawer, self.options, outputs, tile_zooms=self.tiles)
+        results = pipeline.render(self.output_dir)
+        return list(results)
+
+    def run(self, interval: float = DEFAULT_INTERVAL) -> None:
+        """Update every interval seconds, until interrupted."""
+        print(f"Watching '{self.gpx_dir}' for changes (press Ctrl+C to stop)...")
+        while True:
+            start = time.monotonic()
+            rendered = self.update()
+            if rendered:
+                print(
+                    f"Updated {', '.join(rendered)} from {len(self._merged_tracks)} tracks "
+                    f"in {time.monotonic() - start:.2f}s."
+                )
+            time.sleep(max(interval - (time.monotonic() - start), 0))
+
+    def _remove_outputs(self) -> typing.List[str]:
+        log.warning("No tracks left in '%s', removing the images", self.gpx_dir)
+        removed = []
+        for name in self.outputs:
+            suffix = "png" if name == "heatmap" and self.options.heatmap_format == "png" else "svg"
+            image = Path(self.output_dir) / f"{name}.{suffix}"
+            if image.exists():
+                image.unlink()
+                removed.append(name)
+        if self.tiles:
+            # rendering no tracks removes all tiles of the previous tracks
+            TileRenderer([], self.tiles, self.drawer.colors["track"]).render(str(Path(self.output_dir) / "tiles"))
+            removed.append("tiles")
+        return removed
+
+    def _affected_outputs(self, affected: typing.List[Track]) -> typing.List[str]:
+        outputs = [name for name in self.outputs if name != "heatmap"]
+        if "heatmap" in self.outputs and (
+            self._heatmap_region is None
+            or any(spatial_index.intersects(tr.bounds(), self._heatmap_region) for tr in affected)
+        ):
+            outputs.append("heatmap")
+        return [name for name in render_pipeline.OUTPUTS if name in outputs]
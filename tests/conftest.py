@@ -0,0 +1,31 @@
+import datetime
+import pathlib
+
+import pytest
+
+
+def make_gpx(points: int = 600) -> bytes:
+    """Return a GPX document of a track heading north-east at about 4 m/s, one point per second."""
+    start = datetime.datetime(2020, 3, 1, 11, 0, tzinfo=datetime.timezone.utc)
+    trkpts = "".join(
+        f'<trkpt lat="{50.0 + i * 0.00003:.7f}" lon="{14.4 + i * 0.00003:.7f}"><ele>{250 + i % 20}</ele>'
+        f"<time>{(start + datetime.timedelta(seconds=i)).strftime('%Y-%m-%dT%H:%M:%SZ')}</time></trkpt>\n"
+        for i in range(points)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1">\n'
+        f"<trk><trkseg>\n{trkpts}</trkseg></trk></gpx>\n"
+    ).encode("utf-8")
+
+
+@pytest.fixture(name="gpx_data")
+def fixture_gpx_data() -> bytes:
+    return make_gpx()
+
+
+@pytest.fixture(name="gpx_dir")
+def fixture_gpx_dir(tmp_path: pathlib.Path, gpx_data: bytes) -> pathlib.Path:
+    """Directory with a single GPX file."""
+    (tmp_path / "ride.gpx").write_bytes(gpx_data)
+    return tmp_path
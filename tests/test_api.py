@@ -0,0 +1,49 @@
+import gzip
+import io
+import pathlib
+
+import pytest
+
+from stravaviz import api
+from stravaviz.track import Track
+from stravaviz.track_loader import TrackLoader
+
+
+@pytest.mark.parametrize("parser", ["gpxpy", "fast"])
+@pytest.mark.parametrize("file_name", ["ride.gpx", "ride.gpx.gz"])
+def test_load_tracks_leaves_streams_open(gpx_data: bytes, parser: str, file_name: str) -> None:
+    contents = gzip.compress(gpx_data) if file_name.endswith(".gz") else gpx_data
+    stream = io.BytesIO(contents)
+    loader = TrackLoader()
+    loader.parser = parser
+
+    tracks = api.load_tracks({file_name: stream}, loader)
+
+    assert len(tracks) == 1
+    assert not stream.closed
+    # the stream is read, not modified, and can be loaded again
+    stream.seek(0)
+    assert stream.read() == contents
+    stream.seek(0)
+    again = api.load_tracks({file_name: stream}, loader)
+    assert len(again) == 1
+    assert (again[0].lats == tracks[0].lats).all()
+    assert not stream.closed
+
+
+def test_track_append_matches_concatenate(gpx_dir: pathlib.Path) -> None:
+    loader = TrackLoader()
+    loader.jobs = 1
+    (first,) = loader.load_tracks(str(gpx_dir))
+    (second,) = loader.load_tracks(str(gpx_dir))
+    merged = Track.concatenate([first, second])
+    first_points = len(first.lats)
+
+    first.append(second)
+
+    assert first.file_names == merged.file_names
+    assert first.end_time() == merged.end_time()
+    assert first.length_meters == merged.length_meters
+    assert (first.lats == merged.lats).all()
+    assert (first.offsets == merged.offsets).all()
+    assert len(first.lats) == first_points + len(second.lats)
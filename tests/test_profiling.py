@@ -0,0 +1,23 @@
+import pathlib
+
+import pytest
+
+from stravaviz import profiling
+from stravaviz.track_loader import TrackLoader
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_profile_includes_stages_of_worker_processes(
+    monkeypatch: pytest.MonkeyPatch, gpx_dir: pathlib.Path, jobs: int
+) -> None:
+    # restored after the test, so profiling stays off for other tests
+    monkeypatch.setattr(profiling, "_profiler", None)
+    profiler = profiling.enable()
+    loader = TrackLoader()
+    loader.jobs = jobs
+
+    assert len(loader.load_tracks(str(gpx_dir))) == 1
+
+    for name in ("parse", "parse file", "simplify"):
+        assert profiler.stages[name]["calls"] >= 1, name
+    assert profiler.stages["simplify"]["cpu_seconds"] > 0
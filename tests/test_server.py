@@ -0,0 +1,61 @@
+import pathlib
+import threading
+import typing
+import urllib.error
+import urllib.request
+
+import pytest
+
+from stravaviz import server
+from stravaviz.exceptions import ParameterError
+from stravaviz.track_loader import TrackLoader, TrackSet
+
+
+@pytest.fixture(name="render_server")
+def fixture_render_server(gpx_dir: pathlib.Path) -> server.RenderServer:
+    render_server = server.RenderServer(TrackSet(TrackLoader(), str(gpx_dir)))
+    render_server.update()
+    return render_server
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        {"width": "1e300"},
+        {"width": "10001"},
+        {"height": "20000"},
+        {"precision": "11"},
+        {"heatmap_pixels": "100000"},
+        {"width": "nan"},
+        {"heatmap_center": "50,14", "heatmap_radius": "inf"},
+    ],
+)
+def test_render_rejects_out_of_range_parameters(
+    render_server: server.RenderServer, query: typing.Dict[str, str]
+) -> None:
+    with pytest.raises(ParameterError):
+        render_server.render("heatmap", query)
+    assert len(render_server.cache) == 0
+
+
+def test_render_accepts_largest_values(render_server: server.RenderServer) -> None:
+    media_type, data = render_server.render("facets", {"width": "10000", "height": "10000", "precision": "10"})
+    assert media_type == "image/svg+xml"
+    assert b'width="10000mm"' in data
+
+
+def test_request_out_of_range_is_bad_request(render_server: server.RenderServer) -> None:
+    http_server = server._HTTPServer(("127.0.0.1", 0), server._RequestHandler)  # pylint: disable=protected-access
+    http_server.render_server = render_server
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = (
+            f"http://127.0.0.1:{http_server.server_address[1]}/render/heatmap?heatmap_format=png&heatmap_pixels=100000"
+        )
+        with pytest.raises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(url)  # pylint: disable=consider-using-with
+        assert e.value.code == 400
+    finally:
+        http_server.shutdown()
+        http_server.server_close()